@@ -0,0 +1,110 @@
+"""Офлайн-симуляция опроса: фиксированный интервал тарифа против адаптивного (scraper/arrival.py).
+
+У каждого запроса товары появляются пуассоновским потоком; частоты распределены лог-равномерно
+от --min-rate до --max-rate товаров в час. Опрос моделируется по тем же правилам, что в скрапере:
+страница per_page, листание до poll_max_pages, пока вся страница новее отметки. Для обоих режимов
+печатает число запросов к Vinted, задержку обнаружения товаров и число пропущенных товаров.
+
+Запуск из корня репозитория:
+    python benchmarks/adaptive_polling.py [--queries 500] [--hours 24] [--tier-interval 15]
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("ADMINS", "0")
+
+from config_reader import config  # noqa: E402
+from scraper.arrival import plan_poll  # noqa: E402
+from scraper.scheduler import PollJob, with_jitter  # noqa: E402
+
+
+def arrivals(rate_per_hour: float, duration: float, rng: random.Random) -> list:
+    times, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate_per_hour / 3600)
+        if t >= duration:
+            return times
+        times.append(t)
+
+
+def simulate(streams: list, duration: float, tier_interval: float, adaptive: bool, seed: int) -> dict:
+    config.poll_adaptive = adaptive
+    rng = random.Random(seed)
+    random.seed(seed)  # with_jitter использует модуль random
+    jobs = [PollJob(f"q{i}", [], tier_interval) for i in range(len(streams))]
+    marks = [0] * len(streams)  # сколько товаров запроса уже обработано (ID товара — его номер)
+    queue = [(rng.uniform(0, tier_interval), i) for i in range(len(streams))]
+    heapq.heapify(queue)
+    requests, missed, latencies = 0, 0, []
+    while queue:
+        now, i = heapq.heappop(queue)
+        if now >= duration:
+            continue
+        job, times = jobs[i], streams[i]
+        newest = marks[i]
+        while newest < len(times) and times[newest] <= now:
+            newest += 1
+        # Листание страниц по правилам fetch_query
+        fetched_ids, top = [], newest
+        for page in range(config.poll_max_pages):
+            requests += 1
+            page_ids = list(range(top, max(top - job.per_page, 0), -1))
+            fetched_ids.extend(page_ids)
+            top -= job.per_page
+            if not page_ids or page_ids[-1] <= marks[i] + 1 or top <= marks[i]:
+                break
+        seen = [item_id for item_id in fetched_ids if item_id > marks[i]]
+        latencies.extend(now - times[item_id - 1] for item_id in seen)
+        missed += max(0, newest - marks[i] - len(seen))
+        marks[i] = newest
+        # То же, что PollJob.record_poll, но со временем симуляции
+        job.arrival.observe(fetched_ids, now)
+        job.interval, job.per_page = plan_poll(job.tier_interval, job.arrival.rate())
+        heapq.heappush(queue, (now + with_jitter(job.interval), i))
+    latencies.sort()
+    return {
+        "requests": requests,
+        "items": len(latencies),
+        "missed": missed,
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--tier-interval", type=float, default=config.poll_interval_free)
+    parser.add_argument("--min-rate", type=float, default=1 / 168, help="товаров в час (по умолчанию 1 в неделю)")
+    parser.add_argument("--max-rate", type=float, default=50, help="товаров в час")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    duration = args.hours * 3600
+    rates = [math.exp(rng.uniform(math.log(args.min_rate), math.log(args.max_rate))) for _ in range(args.queries)]
+    streams = [arrivals(rate, duration, rng) for rate in rates]
+
+    print(f"{args.queries} запросов, {args.hours:g} ч, интервал тарифа {args.tier_interval:g} с, "
+          f"{sum(map(len, streams))} товаров\n")
+    print(f"{'режим':<12}{'запросов':>12}{'в секунду':>11}{'задержка, с':>13}{'p95, с':>9}{'пропущено':>11}")
+    results = {}
+    for name, adaptive in (("fixed", False), ("adaptive", True)):
+        result = results[name] = simulate(streams, duration, args.tier_interval, adaptive, args.seed)
+        print(f"{name:<12}{result['requests']:>12}{result['requests'] / duration:>11.2f}"
+              f"{result['mean']:>13.2f}{result['p95']:>9.2f}{result['missed']:>11}")
+    fixed, adaptive = results["fixed"], results["adaptive"]
+    print(f"\nЗапросов меньше в {fixed['requests'] / adaptive['requests']:.2f} раза, "
+          f"средняя задержка {adaptive['mean'] - fixed['mean']:+.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Локальные заменители Vinted и Telegram Bot API для нагрузочных тестов.
+
+Vinted:
+  * GET /           — страница с cookie access_token_web (как главная vinted.*);
+  * GET /api/v2/catalog/items?search_text=qN&page=&per_page= — выдача запроса N от новых к старым;
+    у каждого запроса новые товары появляются с частотой --item-rate в секунду;
+  * при превышении --vinted-rps отвечает 429 с Retry-After, как настоящий Vinted;
+  * cookie привязан к прокси, через который получен (заголовок Via), — с чужим cookie ответ 401.
+Telegram:
+  * POST /bot<token>/sendMessage|sendPhoto|sendMediaGroup — отвечает как Bot API и считает сообщения;
+    фото по URL «скачивается» --photo-latency секунд и получает file_id, фото по file_id отправляется сразу.
+Оба сервера отдают статистику на GET /_stats.
+FakeProxy — HTTP forward-прокси с заданной задержкой и долей отказов (для проверки пула прокси).
+
+Запускается отдельным процессом из load_test.py, чтобы генерация ответов не отнимала
+процессорное время у измеряемого бота:
+    python benchmarks/fakes.py --vinted-port 8801 --telegram-port 8802
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import aiohttp
+from aiohttp import web
+
+QUERY_ID_BASE = 1_000_000_000
+QUERY_ID_STRIDE = 1_000_000
+
+
+def query_base_id(query: int) -> int:
+    """ID самого нового товара запроса на момент старта (для начальной отметки last_item_id)."""
+    return QUERY_ID_BASE + query * QUERY_ID_STRIDE
+
+
+class FakeVinted:
+    def __init__(self, item_rate: float, rps: float, epoch: float):
+        self.item_rate = item_rate
+        self.rps = rps
+        self.epoch = epoch
+        self.tokens = rps
+        self.refilled = time.monotonic()
+        self.polls = defaultdict(list)  # номер запроса -> моменты запросов первой страницы
+        self.statuses = defaultdict(int)
+        self.cookies = 0
+        self.egress = defaultdict(int)  # прокси (Via) -> успешные запросы выдачи
+
+    def _allow(self) -> bool:
+        if not self.rps:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rps, self.tokens + (now - self.refilled) * self.rps)
+        self.refilled = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def page(self, request: web.Request) -> web.Response:
+        self.cookies += 1
+        via = request.headers.get("Via", "direct")
+        response = web.Response(text="<html></html>", content_type="text/html")
+        response.set_cookie("access_token_web", f"token-{self.cookies}-{via}", max_age=3600)
+        return response
+
+    async def items(self, request: web.Request) -> web.Response:
+        if not self._allow():
+            self.statuses[429] += 1
+            return web.json_response({"code": 106, "message": "Too many requests"}, status=429,
+                                     headers={"Retry-After": "1"})
+        via = request.headers.get("Via", "direct")
+        if f"-{via}" not in request.headers.get("Cookie", ""):
+            self.statuses[401] += 1
+            return web.json_response({"code": 100, "message": "invalid_authentication_token"}, status=401)
+        search_text = request.query.get("search_text", "q0")
+        query = int(search_text[1:]) if search_text[1:].isdigit() else 0
+        page = int(request.query.get("page", 1))
+        per_page = int(request.query.get("per_page", 10))
+        if page == 1:
+            self.polls[query].append(time.time())
+        newest = query_base_id(query) + int(max(0.0, time.time() - self.epoch) * self.item_rate)
+        first = newest - (page - 1) * per_page
+        items = [self._item(item_id) for item_id in range(first, first - per_page, -1)]
+        self.statuses[200] += 1
+        self.egress[via] += 1
+        return web.json_response({"items": items, "pagination": {"current_page": page, "per_page": per_page}})
+
+    @staticmethod
+    def _item(item_id: int) -> dict:
+        return {
+            "id": item_id,
+            "title": f"Item {item_id}",
+            "url": f"https://www.vinted.fr/items/{item_id}",
+            "brand_title": "Brand",
+            "photo": {"url": f"https://images.vinted.net/{item_id}.jpeg"},
+            "total_item_price": {"amount": "10.0", "currency_code": "EUR"},
+        }
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "polls": {str(query): times for query, times in self.polls.items()},
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "cookies": self.cookies,
+            "egress": self.egress,
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v2/catalog/items", self.items)
+        app.router.add_get("/_stats", self.stats)
+        app.router.add_get("/{tail:.*}", self.page)
+        return app
+
+
+class FakeTelegram:
+    def __init__(self, photo_latency: float = 0.0):
+        self.photo_latency = photo_latency
+        self.messages = 0
+        self.calls = defaultdict(int)
+        self.first = self.last = None
+        self.message_id = 0
+        self.photo_downloads = 0
+        self.file_ids = {}  # file_id -> URL фото
+
+    def _message(self, chat_id, photo: str = None) -> dict:
+        self.message_id += 1
+        message = {"message_id": self.message_id, "date": int(time.time()),
+                   "chat": {"id": int(chat_id), "type": "private"}}
+        if photo is not None:
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo[-8:], "width": 800, "height": 600}]
+        return message
+
+    async def _upload(self, photo: str):
+        """file_id фото; по URL фото сначала «скачивается», как это делает Telegram."""
+        if photo in self.file_ids:
+            return photo
+        if not photo.startswith("http"):
+            return None
+        self.photo_downloads += 1
+        if self.photo_latency:
+            await asyncio.sleep(self.photo_latency)
+        file_id = f"file-{len(self.file_ids)}-{abs(hash(photo)) % 10 ** 8:08d}"
+        self.file_ids[file_id] = photo
+        return file_id
+
+    async def method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        chat_id = data.get("chat_id", 0)
+        self.calls[method] += 1
+        now = time.time()
+        self.first = self.first or now
+        self.last = now
+        if method == "sendMediaGroup":
+            media = json.loads(data.get("media", "[]"))
+            file_ids = await asyncio.gather(*(self._upload(photo["media"]) for photo in media))
+            if None in file_ids:
+                return self._bad_request()
+            self.messages += len(media)
+            result = [self._message(chat_id, file_id) for file_id in file_ids]
+        elif method == "sendPhoto":
+            file_id = await self._upload(data.get("photo", ""))
+            if file_id is None:
+                return self._bad_request()
+            self.messages += 1
+            result = self._message(chat_id, file_id)
+        else:
+            self.messages += 1
+            result = self._message(chat_id)
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _bad_request() -> web.Response:
+        return web.json_response({"ok": False, "error_code": 400,
+                                  "description": "Bad Request: wrong file identifier/HTTP URL specified"},
+                                 status=400)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"messages": self.messages, "calls": self.calls, "first": self.first,
+                                  "last": self.last, "photo_downloads": self.photo_downloads})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_stats", self.stats)
+        app.router.add_post("/bot{token}/{method}", self.method)
+        return app
+
+
+class FakeProxy:
+    """HTTP forward-прокси: пересылает запрос с заголовком Via: <name>, добавляя задержку и отказы.
+
+    Отказ — ответ 502, как у прокси без связи с сервером; fail_rate=1 имитирует мёртвый прокси.
+    """
+
+    def __init__(self, name: str, latency: float = 0.0, fail_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.session = None
+
+    async def forward(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.random.random() < self.fail_rate:
+            return web.Response(status=502, text="Bad Gateway")
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        headers = {name: value for name, value in request.headers.items() if name.lower() in ("cookie", "user-agent")}
+        async with self.session.get(str(request.url), headers=dict(headers, Via=self.name)) as response:
+            proxied = web.Response(body=await response.read(), status=response.status,
+                                   content_type=response.content_type)
+            for cookie in response.headers.getall("Set-Cookie", []):
+                proxied.headers.add("Set-Cookie", cookie)
+            if "Retry-After" in response.headers:
+                proxied.headers["Retry-After"] = response.headers["Retry-After"]
+            return proxied
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.forward)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _close(self, app: web.Application):
+        if self.session is not None:
+            await self.session.close()
+
+
+async def serve(args):
+    runners = []
+    for app, port in ((FakeVinted(args.item_rate, args.vinted_rps, args.epoch).app(), args.vinted_port),
+                      (FakeTelegram(args.photo_latency).app(), args.telegram_port)):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port, backlog=4096).start()
+        runners.append(runner)
+    print("ready", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vinted-port", type=int, default=8801)
+    parser.add_argument("--telegram-port", type=int, default=8802)
+    parser.add_argument("--item-rate", type=float, default=0.05, help="новых товаров в секунду на запрос")
+    parser.add_argument("--vinted-rps", type=float, default=0, help="лимит Vinted до ответа 429 (0 — без лимита)")
+    parser.add_argument("--photo-latency", type=float, default=0.0,
+                        help="сколько секунд Telegram скачивает фото по URL")
+    parser.add_argument("--epoch", type=float, default=None, help="Unix-время, с которого появляются товары")
+    args = parser.parse_args()
+    args.epoch = args.epoch or time.time()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
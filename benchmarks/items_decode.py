@@ -0,0 +1,144 @@
+"""Микробенчмарк разбора страницы выдачи Vinted: словари json против Item (json и orjson).
+
+Для каждого варианта печатает время разбора одной страницы и сколько памяти занимает результат,
+который скрапер держит до конца обработки запроса.
+
+Запуск из корня репозитория:
+    python benchmarks/items_decode.py [--items 96] [--repeat 2000]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import items as items_module  # noqa: E402
+from scraper.items import parse_items  # noqa: E402
+
+
+def synthetic_item(item_id: int) -> dict:
+    """Объект, близкий по составу полей к ответу /api/v2/catalog/items."""
+    photo_url = f"https://images1.vinted.net/t/{item_id}/f800/photo.jpeg"
+    return {
+        "id": item_id,
+        "title": f"Sneakers Nike Air Max {item_id}",
+        "price": {"amount": "45.0", "currency_code": "EUR"},
+        "is_visible": True,
+        "discount": None,
+        "brand_title": "Nike",
+        "path": f"/items/{item_id}-sneakers-nike-air-max",
+        "user": {
+            "id": item_id * 7,
+            "login": f"seller{item_id}",
+            "profile_url": f"https://www.vinted.fr/member/{item_id * 7}",
+            "photo": None,
+            "business": False,
+        },
+        "conversion": None,
+        "url": f"https://www.vinted.fr/items/{item_id}-sneakers-nike-air-max",
+        "promoted": False,
+        "photo": {
+            "id": item_id * 3,
+            "image_no": 1,
+            "width": 600,
+            "height": 800,
+            "dominant_color": "#8C8C8C",
+            "dominant_color_opaque": "#DCDCDC",
+            "url": photo_url,
+            "is_main": True,
+            "thumbnails": [
+                {"type": kind, "url": photo_url.replace("f800", kind), "width": size, "height": size,
+                 "original_size": None}
+                for kind, size in (("thumb70x100", 70), ("thumb150x210", 150), ("thumb310x430", 310),
+                                   ("thumb428x624", 428), ("thumb624x428", 624), ("thumb364x428", 364))
+            ],
+            "high_resolution": {"id": f"{item_id}_hr", "timestamp": 1730000000, "orientation": None},
+            "is_suspicious": False,
+            "full_size_url": photo_url.replace("f800", "full"),
+            "is_hidden": False,
+            "extra": {},
+        },
+        "favourite_count": 12,
+        "is_favourite": False,
+        "badge": None,
+        "service_fee": {"amount": "2.95", "currency_code": "EUR"},
+        "total_item_price": {"amount": "47.95", "currency_code": "EUR"},
+        "view_count": 0,
+        "size_title": "42",
+        "content_source": "search",
+        "status": "Très bon état",
+        "icon_badges": [],
+        "item_box": {
+            "first_line": "Nike",
+            "second_line": "42 · Très bon état",
+            "accessibility_label": f"Sneakers Nike Air Max {item_id}, Nike, 42, 45,00 €",
+            "item_id": item_id,
+            "exposure": {"test_id": "exp", "variant": "on"},
+        },
+        "search_tracking_params": {"score": 0.93, "matched_queries": ["nike", "air max"]},
+    }
+
+
+def synthetic_page(count: int) -> bytes:
+    page = {
+        "items": [synthetic_item(10_000_000 + i) for i in range(count, 0, -1)],
+        "pagination": {"current_page": 1, "total_pages": 50, "total_entries": 5000, "per_page": count},
+    }
+    return json.dumps(page).encode()
+
+
+def decode_dicts(body: bytes) -> list:
+    # Прежний путь: response.json() и работа со словарями всей страницы
+    return json.loads(body).get("items", [])
+
+
+def decode_items_json(body: bytes) -> list:
+    saved, items_module.orjson = items_module.orjson, None
+    try:
+        return parse_items(body)
+    finally:
+        items_module.orjson = saved
+
+
+def retained_bytes(decode, body: bytes) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = decode(body)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=96)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    body = synthetic_page(args.items)
+    variants = [("dict (json)", decode_dicts), ("Item (json)", decode_items_json)]
+    if items_module.orjson is not None:
+        variants.append(("Item (orjson)", parse_items))
+    else:
+        print("orjson не установлен — вариант Item (orjson) пропущен.")
+
+    print(f"Страница: {args.items} товаров, {len(body) / 1024:.1f} KiB JSON\n")
+    print(f"{'вариант':<16}{'мкс/страница':>14}{'ускорение':>11}{'память, KiB':>14}{'экономия':>10}")
+    base_time = base_memory = None
+    for name, decode in variants:
+        seconds = min(timeit.repeat(lambda: decode(body), number=args.repeat, repeat=3)) / args.repeat
+        memory = retained_bytes(decode, body)
+        base_time = base_time or seconds
+        base_memory = base_memory or memory
+        print(f"{name:<16}{seconds * 1e6:>14.1f}{base_time / seconds:>10.2f}x"
+              f"{memory / 1024:>14.1f}{base_memory / memory:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Нагрузочный тест скрапера и отправки уведомлений на локальных заменителях Vinted и Telegram.
+
+Для каждого масштаба (по умолчанию 100, 1000 и 10000 ссылок) поднимает benchmarks/fakes.py,
+создаёт во временной базе синтетических пользователей и ссылки и запускает periodic_check
+вместе с NotificationDispatcher, как в bot.py. После прогрева измеряет:
+  * links/s         — сколько ссылок проверено в секунду;
+  * cycle p50/p99   — фактический интервал между опросами одного запроса (по журналу fake Vinted);
+  * DB s/s          — секунд в вызовах DAO на секунду работы (включая ожидание пакетного писателя);
+  * notifications/s — сколько уведомлений принял fake Telegram.
+
+Результаты печатаются таблицей и сохраняются в benchmarks/results/<время>.json;
+--compare <файл> выводит изменения относительно сохранённого прогона.
+
+Запуск из корня репозитория:
+    python benchmarks/load_test.py [--scales 100 1000 10000] [--duration 60] [--compare results/....json]
+
+Любую настройку config_reader можно переопределить переменной окружения (например, POLL_INTERVAL_PREMIUM=5).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Ограничения, которые в бою защищают Vinted и Telegram, здесь мешали бы измерить сам бот
+BENCHMARK_ENV = {
+    "BOT_TOKEN": "123456:benchmark",
+    "ADMINS": "1",
+    "RATE_LIMIT_RPS": "5000",
+    "RATE_LIMIT_BURST": "500",
+    "TELEGRAM_GLOBAL_RPS": "5000",
+    "TELEGRAM_GLOBAL_BURST": "500",
+    "METRICS_PORT": "0",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def metric_total(metric, suffix: str = "") -> float:
+    """Сумма всех значений метрики (для гистограммы с suffix="_sum" — суммарное время)."""
+    return sum(value for name, _, value in metric.samples() if name == metric.name + suffix)
+
+
+async def get_json(url: str) -> dict:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+
+async def seed(links: int, queries: int, premium_ratio: float, vinted: str, epoch: float, item_rate: float):
+    """Пользователи по одной ссылке; ссылки делят queries поисковых запросов, как одинаковые поиски в бою."""
+    from sqlalchemy import insert
+    from data_base.database import engine
+    from data_base.models import User, Link
+    from benchmarks.fakes import query_base_id
+    from utils import convert_client_to_api_url, query_hash
+
+    premium_every = round(1 / premium_ratio) if premium_ratio else 0
+    elapsed = int(max(0.0, time.time() - epoch) * item_rate)
+    users, rows = [], []
+    for user_id in range(1, links + 1):
+        query = user_id % queries
+        link = f"{vinted}/catalog?search_text=q{query}"
+        api_url = convert_client_to_api_url(link)
+        users.append({"user_id": user_id, "is_premium": bool(premium_every) and user_id % premium_every == 0})
+        # Отметка на текущем новом товаре: уведомления вызывают только товары, появившиеся во время теста
+        rows.append({"user_id": user_id, "link": link, "api_url": api_url, "query_hash": query_hash(api_url),
+                     "last_item_id": query_base_id(query) + elapsed})
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), users)
+        await conn.execute(insert(Link), rows)
+
+
+async def run_scale(args) -> dict:
+    """Один масштаб в отдельном процессе: конфиг и модули читаются заново, база своя."""
+    import metrics
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from config_reader import config
+    from data_base.base import create_tables
+    from data_base.writer import db_writer
+    from notifier.dispatcher import NotificationDispatcher
+    from scraper.http_client import http_client
+    from scraper.scraper import periodic_check
+
+    vinted = f"http://127.0.0.1:{args.vinted_port}"
+    telegram = f"http://127.0.0.1:{args.telegram_port}"
+    await create_tables()
+    await seed(args.run, args.queries, args.premium_ratio, vinted, args.epoch, args.item_rate)
+
+    await http_client.start()
+    bot = Bot(token=config.bot_token.get_secret_value(),
+              session=AiohttpSession(api=TelegramAPIServer.from_base(telegram)))
+    tasks = [asyncio.create_task(periodic_check()), asyncio.create_task(NotificationDispatcher(bot).run())]
+    polling_started = time.time()
+
+    def snapshot():
+        return {
+            "links": metric_total(metrics.scraper_links_polled_total),
+            "db": metric_total(metrics.db_query_seconds, "_sum"),
+            "db_write": metric_total(metrics.db_write_batch_seconds, "_sum"),
+        }
+
+    await asyncio.sleep(args.warmup)
+    before, telegram_before, started = snapshot(), await get_json(f"{telegram}/_stats"), time.time()
+    await asyncio.sleep(args.duration)
+    after, telegram_after, finished = snapshot(), await get_json(f"{telegram}/_stats"), time.time()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await http_client.close()
+    await db_writer.stop()
+    await bot.session.close()
+
+    vinted_stats = await get_json(f"{vinted}/_stats")
+    polls = {int(query): times for query, times in vinted_stats["polls"].items()}
+    intervals = []
+    for query in range(args.queries):
+        times = polls.get(query, [])
+        # Интервал до каждого опроса в окне считаем от предыдущего опроса, даже если тот был до окна
+        in_window = [b - a for a, b in zip(times, times[1:]) if started <= b <= finished]
+        if not in_window:
+            # Запрос ни разу не опрошен за окно: он ждёт как минимум столько — иначе отставание не видно
+            previous = [ts for ts in times if ts < started]
+            in_window = [finished - (previous[-1] if previous else polling_started)]
+        intervals.extend(in_window)
+    elapsed = finished - started
+    return {
+        "links": args.run,
+        "queries": args.queries,
+        "links_per_second": (after["links"] - before["links"]) / elapsed,
+        "cycle_p50": percentile(intervals, 0.5),
+        "cycle_p99": percentile(intervals, 0.99),
+        "db_seconds_per_second": (after["db"] - before["db"]) / elapsed,
+        "db_write_seconds_per_second": (after["db_write"] - before["db_write"]) / elapsed,
+        "notifications_per_second": (telegram_after["messages"] - telegram_before["messages"]) / elapsed,
+        "vinted_statuses": vinted_stats["statuses"],
+        "poll_interval_premium": config.poll_interval_premium,
+        "poll_interval_free": config.poll_interval_free,
+    }
+
+
+def run_in_subprocess(links: int, args, env: dict) -> dict:
+    vinted_port, telegram_port = free_port(), free_port()
+    epoch = time.time()
+    fakes = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fakes.py"), "--vinted-port", str(vinted_port),
+         "--telegram-port", str(telegram_port), "--item-rate", str(args.item_rate),
+         "--vinted-rps", str(args.vinted_rps), "--epoch", str(epoch)],
+        stdout=subprocess.PIPE, text=True, env=env,
+    )
+    try:
+        fakes.stdout.readline()  # "ready"
+        queries = max(1, round(links * args.unique_ratio))
+        with tempfile.TemporaryDirectory(prefix="load-test-") as workdir:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", str(links), "--queries", str(queries),
+                 "--vinted-port", str(vinted_port), "--telegram-port", str(telegram_port),
+                 "--epoch", str(epoch), "--item-rate", str(args.item_rate),
+                 "--premium-ratio", str(args.premium_ratio),
+                 "--warmup", str(args.warmup), "--duration", str(args.duration)],
+                cwd=workdir, env=env, stdout=subprocess.PIPE, text=True, check=True,
+            )
+        return json.loads(child.stdout.strip().splitlines()[-1])
+    finally:
+        fakes.terminate()
+        fakes.wait()
+
+
+COLUMNS = [
+    ("links", "links", "{:.0f}"),
+    ("links/s", "links_per_second", "{:.1f}"),
+    ("cycle p50", "cycle_p50", "{:.2f}s"),
+    ("cycle p99", "cycle_p99", "{:.2f}s"),
+    ("DB s/s", "db_seconds_per_second", "{:.3f}"),
+    ("notif/s", "notifications_per_second", "{:.1f}"),
+]
+
+
+def print_table(runs, baseline=None):
+    print("".join(f"{title:>12}" for title, _, _ in COLUMNS) + ("     vs baseline" if baseline else ""))
+    base_by_links = {run["links"]: run for run in (baseline or {}).get("runs", [])}
+    for run in runs:
+        line = "".join(f"{fmt.format(run[key]):>12}" for _, key, fmt in COLUMNS)
+        base = base_by_links.get(run["links"])
+        if base:
+            deltas = []
+            for title, key, _ in COLUMNS[1:]:
+                if base[key]:
+                    deltas.append(f"{title} {(run[key] - base[key]) / base[key] * 100:+.0f}%")
+            line += "   " + ", ".join(deltas)
+        print(line)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--duration", type=float, default=60, help="секунд измерения на масштаб")
+    parser.add_argument("--warmup", type=float, default=20, help="секунд до начала измерения")
+    parser.add_argument("--unique-ratio", type=float, default=0.8, help="доля уникальных поисковых запросов")
+    parser.add_argument("--premium-ratio", type=float, default=0.5)
+    parser.add_argument("--item-rate", type=float, default=0.05, help="новых товаров в секунду на запрос")
+    parser.add_argument("--vinted-rps", type=float, default=0, help="лимит fake Vinted до ответа 429")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--output", help="куда сохранить результаты (по умолчанию benchmarks/results/)")
+    # Параметры дочернего процесса одного масштаба
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--queries", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--vinted-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--telegram-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--epoch", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(asyncio.run(run_scale(args))))
+        return
+
+    env = dict(BENCHMARK_ENV, **os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    runs = []
+    for links in args.scales:
+        print(f"Масштаб {links} ссылок: прогрев {args.warmup:.0f} с, измерение {args.duration:.0f} с...", flush=True)
+        runs.append(run_in_subprocess(links, args, env))
+
+    result = {
+        "revision": git_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: getattr(args, key) for key in
+                     ("duration", "warmup", "unique_ratio", "premium_ratio", "item_rate", "vinted_rps")},
+        "runs": runs,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"Сравнение с {args.compare} (ревизия {baseline.get('revision')})")
+    print_table(runs, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2)
+    print(f"Результаты сохранены в {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Проверка миграций на базе, созданной первой версией бота (до outbox, шардирования и т.д.).
+
+Создаёт во временном каталоге first_database.db со схемой первой версии и парой строк,
+запускает create_tables() (миграции выполняются в ней) и проверяет, что:
+  * в каждой таблице есть все колонки текущих моделей;
+  * новые колонки с server_default получили значения по умолчанию у старых строк;
+  * у старых ссылок рассчитаны api_url и query_hash.
+
+Запуск из корня репозитория:
+    python benchmarks/migration_check.py
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Схема, которую создавала первая версия бота (Base.metadata.create_all)
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    user_id BIGINT NOT NULL,
+    is_premium BOOLEAN NOT NULL,
+    is_admin BOOLEAN NOT NULL,
+    is_banned BOOLEAN NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id)
+);
+CREATE TABLE links (
+    id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    link VARCHAR,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (user_id)
+);
+CREATE TABLE sent_items (
+    id INTEGER NOT NULL,
+    item_id BIGINT NOT NULL,
+    title VARCHAR NOT NULL,
+    img_url VARCHAR NOT NULL,
+    item_url VARCHAR NOT NULL,
+    link_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT _item_link_uc UNIQUE (item_id, link_id),
+    FOREIGN KEY(link_id) REFERENCES links (id)
+);
+INSERT INTO users (user_id, is_premium, is_admin, is_banned) VALUES (1, 0, 0, 0), (2, 1, 0, 0);
+INSERT INTO links (id, user_id, link) VALUES
+    (1, 1, 'https://www.vinted.fr/catalog?search_text=nike&order=newest_first'),
+    (2, 2, 'https://www.vinted.de/catalog?search_text=adidas');
+INSERT INTO sent_items (item_id, title, img_url, item_url, link_id) VALUES (100, 't', 'i', 'u', 1);
+"""
+
+
+def check(database: str) -> bool:
+    from data_base.database import Base
+    conn = sqlite3.connect(database)
+    ok = True
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table.name})")}
+        missing = {column.name for column in table.columns} - existing
+        if missing:
+            print(f"FAIL {table.name}: нет колонок {sorted(missing)}")
+            ok = False
+    users = conn.execute("SELECT user_id, is_active FROM users ORDER BY user_id").fetchall()
+    links = conn.execute("SELECT id, is_suspended, api_url, query_hash FROM links ORDER BY id").fetchall()
+    print(f"users: {users}\nlinks: {links}")
+    if any(is_active != 1 for _, is_active in users):
+        print("FAIL users.is_active не получил значение по умолчанию")
+        ok = False
+    if any(is_suspended != 0 or not api_url or query_hash is None for _, is_suspended, api_url, query_hash in links):
+        print("FAIL links: нет значения по умолчанию или api_url/query_hash")
+        ok = False
+    conn.close()
+    return ok
+
+
+async def migrate():
+    import data_base.models  # noqa: F401 — регистрирует модели в Base.metadata
+    from data_base.base import create_tables
+    from data_base.database import engine, write_engine
+    await create_tables()
+    await create_tables()  # Повторный запуск не должен ничего менять
+    await engine.dispose()
+    await write_engine.dispose()
+
+
+def main():
+    os.environ.setdefault("BOT_TOKEN", "0:check")
+    os.environ.setdefault("ADMINS", "0")
+    with tempfile.TemporaryDirectory(prefix="migration-check-") as workdir:
+        os.chdir(workdir)  # База first_database.db создаётся в текущем каталоге
+        conn = sqlite3.connect("first_database.db")
+        conn.executescript(BASELINE_SCHEMA)
+        conn.close()
+        asyncio.run(migrate())
+        ok = check("first_database.db")
+    print("OK" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
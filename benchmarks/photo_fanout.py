@@ -0,0 +1,97 @@
+"""Рассылка одного и того же товара многим чатам: фото по URL против кэша file_id (notifier/photo_cache.py).
+
+Кладёт в outbox --items популярных товаров для каждого из --chats чатов и отправляет их
+NotificationDispatcher через fake Telegram, который «скачивает» каждое фото по URL
+--photo-latency секунд. Для каждого режима печатает время рассылки и число скачиваний фото.
+
+Запуск из корня репозитория:
+    python benchmarks/photo_fanout.py [--chats 200] [--items 5] [--photo-latency 0.5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from aiohttp import web  # noqa: E402
+
+from fakes import FakeTelegram  # noqa: E402
+
+TELEGRAM_PORT = 8831
+
+
+async def fan_out(args, cache_size: int) -> dict:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from config_reader import config
+    from data_base.dao import count_notifications
+    from notifier import dispatcher as dispatcher_module
+    from notifier.dispatcher import NotificationDispatcher
+    from notifier.outbox import enqueue_items
+    from notifier.photo_cache import PhotoCache
+    from scraper.items import Item
+
+    telegram = FakeTelegram(args.photo_latency)
+    runner = web.AppRunner(telegram.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", TELEGRAM_PORT).start()
+    dispatcher_module.photo_cache = PhotoCache(cache_size)
+
+    items = [Item(id=item_id, title=f"Item {item_id}", url=f"https://www.vinted.fr/items/{item_id}",
+                  brand="Brand", price="10.0", currency="EUR", photo=f"https://images.vinted.net/{item_id}.jpeg")
+             for item_id in range(1, args.items + 1)]
+    for chat_id in range(1, args.chats + 1):
+        await enqueue_items(chat_id, items)
+
+    bot = Bot(token=config.bot_token.get_secret_value(),
+              session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{TELEGRAM_PORT}")))
+    started = time.monotonic()
+    task = asyncio.create_task(NotificationDispatcher(bot).run())
+    while await count_notifications():
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await bot.session.close()
+    await runner.cleanup()
+    return {"seconds": elapsed, "messages": telegram.messages, "downloads": telegram.photo_downloads}
+
+
+async def run(args):
+    from data_base.base import create_tables
+    from data_base.writer import db_writer
+    await create_tables()
+    print(f"{args.chats} чатов x {args.items} товаров, скачивание фото {args.photo_latency:g} с\n")
+    print(f"{'режим':<12}{'время, с':>10}{'сообщений':>11}{'скачиваний':>12}")
+    results = {}
+    for name, cache_size in (("url", 0), ("file_id", args.cache_size)):
+        result = results[name] = await fan_out(args, cache_size)
+        print(f"{name:<12}{result['seconds']:>10.2f}{result['messages']:>11}{result['downloads']:>12}")
+    await db_writer.stop()
+    print(f"\nРассылка быстрее в {results['url']['seconds'] / results['file_id']['seconds']:.1f} раза")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--photo-latency", type=float, default=0.5)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    args = parser.parse_args()
+    # Лимиты, которые в бою защищают Telegram, здесь мешали бы измерить саму рассылку
+    for name, value in {"BOT_TOKEN": "123456:benchmark", "ADMINS": "1", "TELEGRAM_GLOBAL_RPS": "5000",
+                        "TELEGRAM_GLOBAL_BURST": "500", "TELEGRAM_CHAT_INTERVAL": "0", "METRICS_PORT": "0"}.items():
+        os.environ.setdefault(name, value)
+    with tempfile.TemporaryDirectory(prefix="photo-fanout-") as workdir:
+        os.chdir(workdir)  # База first_database.db создаётся в текущем каталоге
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Локальная проверка шардирования скрапера между несколькими процессами.
+
+Запускает несколько процессов с настоящим periodic_check на временной базе (вместо HTTP-запроса
+к Vinted процесс пишет опрошенные ссылки в журнал), посреди прогона убивает один из них (SIGKILL)
+и добавляет новый, после чего по журналам опросов проверяет:
+  * ни одну ссылку не опрашивали два процесса одновременно;
+  * ни одна ссылка не осталась без опроса дольше, чем занимает перехват аренды;
+  * новый процесс получил свою долю партиций.
+
+Запуск из корня репозитория:
+    BOT_TOKEN=1:a ADMINS=1 python benchmarks/sharding_check.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SHARDS = 16
+# Продление аренды может ждать блокировку записи до DB_BUSY_TIMEOUT_MS, поэтому аренда
+# должна быть длиннее этого ожидания вместе с интервалом обновления — иначе она истекает у живого процесса
+BUSY_TIMEOUT = 1.0
+LEASE_TTL = 6.0
+RELEASE_GRACE = 1.0
+REFRESH_INTERVAL = 1.0
+POLL_INTERVAL = 0.5
+TICK = 0.25
+
+os.environ.update({
+    "SCRAPER_SHARDS": str(SHARDS),
+    "SHARD_LEASE_TTL": str(LEASE_TTL),
+    "SHARD_RELEASE_GRACE": str(RELEASE_GRACE),
+    "POLL_REFRESH_INTERVAL": str(REFRESH_INTERVAL),
+    "DB_BUSY_TIMEOUT_MS": str(int(BUSY_TIMEOUT * 1000)),
+    # Постоянный интервал опроса, чтобы пропуски в журнале означали только перехват аренды
+    "POLL_INTERVAL_PREMIUM": str(POLL_INTERVAL),
+    "POLL_JITTER": "0",
+    "POLL_ADAPTIVE": "false",
+})
+
+
+async def run_worker(name: str, duration: float):
+    """Запускает periodic_check, в котором запрос к Vinted заменён записью опрошенных ссылок в журнал."""
+    import scraper.scraper as scraper
+    from data_base.writer import db_writer
+    from scraper.sharding import ShardManager
+
+    with open(f"{name}.log", "a") as log:
+        async def fetch_query(url_api, links, per_page):
+            now = time.time()
+            for link in links:
+                log.write(json.dumps([now, name, link.id]) + "\n")
+            log.flush()
+            return []
+
+        scraper.fetch_query = fetch_query
+        task = asyncio.create_task(scraper.periodic_check(ShardManager(SHARDS, worker_id=name)))
+        await asyncio.sleep(duration)
+        # periodic_check при отмене освобождает аренду
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await db_writer.stop()
+
+
+async def prepare(links: int):
+    from data_base.base import create_tables
+    from data_base.dao import add_user, add_link
+
+    await create_tables()
+    for user_id in range(1, links + 1):
+        await add_user(user_id=user_id, is_premium=True)
+        await add_link(user_id=user_id, link=f"https://www.vinted.fr/catalog?search_text=q{user_id}")
+
+
+def spawn(name: str, duration: float) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", name,
+                             "--duration", str(duration)])
+
+
+def analyse(names, links: int) -> bool:
+    polls = defaultdict(list)  # link_id -> [(время, процесс)]
+    for name in names:
+        if not os.path.exists(f"{name}.log"):
+            continue
+        with open(f"{name}.log") as log:
+            for line in log:
+                try:
+                    ts, worker, link_id = json.loads(line)
+                except ValueError:
+                    continue  # Последняя строка убитого процесса может быть оборвана
+                polls[link_id].append((ts, worker))
+
+    # Перехват партиции упавшего процесса: истечение аренды + обновление + опрос
+    max_gap = LEASE_TTL + REFRESH_INTERVAL + POLL_INTERVAL + 1.0
+    # Процессы стартуют и завершаются в разное время, поэтому окно проверки берём по самим журналам:
+    # от раздачи партиций после старта всех процессов до выхода первого из выживших (names[0] убит)
+    last = defaultdict(float)
+    for records in polls.values():
+        for ts, worker in records:
+            last[worker] = max(last[worker], ts)
+    warmup = max(min(ts for ts, _ in records) for records in polls.values()) + LEASE_TTL + REFRESH_INTERVAL
+    finished = min(ts for worker, ts in last.items() if worker != names[0])
+    ok = True
+    duplicates = gaps = 0
+    for link_id in range(1, links + 1):
+        # После окна выжившие завершаются и освобождают аренду, а оставшиеся сразу её подхватывают
+        records = sorted(record for record in polls.get(link_id, []) if record[0] <= finished)
+        if not records:
+            print(f"link {link_id}: ни разу не опрошена")
+            ok = False
+            continue
+        # Два владельца одновременно дали бы записи разных процессов ближе, чем через интервал опроса;
+        # при передаче партиции между последним опросом старого и первым опросом нового владельца
+        # проходит не меньше интервала обновления
+        for (t1, w1), (t2, w2) in zip(records, records[1:]):
+            if w1 != w2 and t2 - t1 < POLL_INTERVAL:
+                duplicates += 1
+                if duplicates <= 5:
+                    print(f"link {link_id}: опрошена {w1} и {w2} с разницей {t2 - t1:.3f} с")
+        times = [warmup] + [ts for ts, _ in records if ts >= warmup] + [finished]
+        for t1, t2 in zip(times, times[1:]):
+            if t2 - t1 > max_gap:
+                gaps += 1
+                if gaps <= 5:
+                    print(f"link {link_id}: пропуск {t2 - t1:.1f} с (допустимо {max_gap:.1f} с)")
+    # Опоздавший процесс должен забрать свою долю: партиции упавшего или отданные живыми при перебалансировке
+    late = names[-1]
+    late_links = {link_id for link_id, records in polls.items()
+                  if any(worker == late and ts <= finished for ts, worker in records)}
+    expected = links // (len(names) - 1) // 2
+    if len(late_links) < expected:
+        print(f"{late}: опросил {len(late_links)} ссылок, ожидалось не меньше {expected}")
+        ok = False
+    print(f"Окно проверки: {finished - warmup:.1f} с")
+    print(f"Ссылок: {links}, опросов: {sum(len(r) for r in polls.values())}, "
+          f"двойных опросов: {duplicates}, пропусков: {gaps}, ссылок у {late}: {len(late_links)}")
+    return ok and not duplicates and not gaps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--worker")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--links", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(run_worker(args.worker, args.duration))
+        return
+
+    os.chdir(tempfile.mkdtemp(prefix="sharding-check-"))
+    asyncio.run(prepare(args.links))
+    names = [f"w{i}" for i in range(args.workers)]
+    processes = {name: spawn(name, args.duration) for name in names}
+
+    # Импорт зависимостей занимает время — убиваем процесс, когда он уже точно опрашивает ссылки
+    while not os.path.exists(f"{names[0]}.log") or not os.path.getsize(f"{names[0]}.log"):
+        time.sleep(TICK)
+    time.sleep(args.duration / 3)
+    print(f"Убиваем {names[0]}")
+    processes[names[0]].send_signal(signal.SIGKILL)
+    time.sleep(TICK)
+    late = f"w{args.workers}"
+    print(f"Запускаем {late}")
+    names.append(late)
+    processes[late] = spawn(late, args.duration)
+
+    for process in processes.values():
+        process.wait()
+    ok = analyse(names, args.links)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
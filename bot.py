@@ -1,12 +1,22 @@
 import asyncio
 import logging
 
+from config_reader import config
+from metrics import BOT_METRICS_PORT, start_metrics_server, stop_metrics_server
 from create_bot import bot, dp, admins
 from data_base.base import create_tables
+from data_base.writer import db_writer
 from aiogram.types import BotCommand, BotCommandScopeDefault
 from handlers.admin_commands import admin_router
 from handlers.main_commands import router
-from scraper.scraper import periodic_check
+from notifier.broadcast import resume_broadcasts, stop_broadcasts
+from notifier.dispatcher import NotificationDispatcher
+from scraper_service import start_scraper, stop_scraper
+
+# Фоновые задачи, которые нужно остановить при завершении работы бота
+background_tasks: set[asyncio.Task] = set()
+scraper_tasks: list[asyncio.Task] = []
+metrics_server = None
 
 
 # Функция, которая настроит командное меню (дефолтное для всех пользователей)
@@ -17,16 +27,23 @@ async def set_commands():
 
 # Функция, которая выполнится когда бот запустится
 async def start_bot():
+    global metrics_server
     await set_commands()
     await create_tables()
+    metrics_server = await start_metrics_server(BOT_METRICS_PORT)
     for admin_id in admins:
         try:
             await bot.send_message(admin_id, f'Bot started.')
         except Exception as e:
             logging.error(f"Ошибка при отправке сообщения админу {admin_id}: {e}")
 
-    # Запускаем периодическую проверку новых товаров
-    asyncio.create_task(periodic_check(bot))
+    # Скрапер работает в этом же процессе, если не запущен отдельно (scraper_service.py)
+    if config.embedded_scraper:
+        scraper_tasks.extend(await start_scraper())
+    # Уведомления из outbox отправляются независимо от скрапера
+    background_tasks.add(asyncio.create_task(NotificationDispatcher(bot).run()))
+    # Рассылки, прерванные прошлой остановкой, продолжаются с сохранённого места
+    await resume_broadcasts(bot)
 
 
 # Функция, которая выполнится когда бот завершит свою работу
@@ -36,6 +53,16 @@ async def stop_bot():
             await bot.send_message(admin_id, 'Bot stopped')
     except Exception as e:
         logging.error(f"Ошибка при отправке сообщения админу при остановке бота: {e}")
+    await stop_broadcasts()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if scraper_tasks:
+        await stop_scraper(scraper_tasks)
+        scraper_tasks.clear()
+    await db_writer.stop()  # Дописываем накопившиеся изменения до выхода
+    await stop_metrics_server(metrics_server)
 
 
 async def main():
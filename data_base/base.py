@@ -1,13 +1,18 @@
+import metrics
 from data_base.database import engine, Base, async_session
+from data_base.migrations import enable_incremental_vacuum, run_migrations
 
 
 def connection(func):
     async def wrapper(*args, **kwargs):
-        async with async_session() as session:
-            return await func(session, *args, **kwargs)
+        with metrics.db_query_seconds.time(operation=func.__name__):
+            async with async_session() as session:
+                return await func(session, *args, **kwargs)
 
     return wrapper
 
 async def create_tables():
+    await enable_incremental_vacuum()
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations()
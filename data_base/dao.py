@@ -1,11 +1,20 @@
 import logging
+import math
+import sqlite3
+import time
+from typing import Dict, List, Optional
 
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, delete, update, func, case, exists, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, aliased
 
 from data_base.base import connection
-from data_base.models import User, Link, SentItem
+from data_base.writer import write_connection
+from data_base.models import (User, Link, SentItem, Notification, Broadcast, LinkChange, ShardLease, ScraperWorker,
+                              ScraperStatus)
+from data_base.registry import link_registry
+from utils import convert_client_to_api_url, query_hash
 
 
 @connection
@@ -22,6 +31,13 @@ async def add_user(session, user_id: int, is_premium: bool = False, is_admin: bo
             return new_user  # Возвращаем только что созданного пользователя
         else:
             logging.info(f"Пользователь с ID {user_id} найден!")
+            if not user.is_active:
+                # Пользователь снова запустил бота после блокировки — возобновляем уведомления
+                user.is_active = True
+                session.add(LinkChange(user_id=user_id))
+                await session.commit()
+                await session.refresh(user)
+                await link_registry.reload_user(user_id)
             return user  # Если пользователь уже существует, возвращаем его
     except SQLAlchemyError as e:
         logging.error(f"Ошибка при добавлении пользователя: {e}")
@@ -36,13 +52,30 @@ async def add_link(session, user_id: int, link: str):
         if not user:
             logging.info(f"Пользователь с ID {user_id} найден!")
             return None
+        # Канонический API URL считаем один раз здесь, а не на каждом цикле опроса
+        api_url = convert_client_to_api_url(link)
+        hashed = query_hash(api_url)
+        suspended = next((known for known in user.links if known.is_suspended and known.query_hash == hashed), None)
+        if suspended is not None:
+            # Повторное добавление приостановленной ссылки возобновляет её опрос с прежней историей
+            suspended.is_suspended = False
+            suspended.suspended_reason = None
+            session.add(LinkChange(user_id=user_id))
+            await session.commit()
+            await session.refresh(suspended)
+            link_registry.add_link(user_id, suspended)
+            logging.info(f"Ссылка '{suspended}' возобновлена для пользователя с ID {user_id}.")
+            return True
         max_link = 15 if user.is_premium else 2
         if len(user.links) >= max_link:
             logging.warning(f"Пользователь с ID {user_id} достиг лимита ссылок.")
             return False
-        new_link = Link(user_id=user_id, link=link)
+        new_link = Link(user_id=user_id, link=link, api_url=api_url, query_hash=hashed)
         session.add(new_link)
+        session.add(LinkChange(user_id=user_id))
         await session.commit()
+        await session.refresh(new_link)
+        link_registry.add_link(user_id, new_link)
         logging.info(f"Ссылка '{new_link}' добавлена для пользователя с ID {user_id}.")
         return True
     except SQLAlchemyError as e:
@@ -50,43 +83,42 @@ async def add_link(session, user_id: int, link: str):
         await session.rollback()
 
 
-from sqlalchemy import text
+@write_connection
+async def add_sent_items(session, link_id: int, items: List[dict], high_water_mark: Optional[int] = None,
+                         notifications: Optional[Dict[int, dict]] = None, album_window: float = 0):
+    """Сохраняет страницу товаров ссылки одной транзакцией и возвращает ID только что добавленных.
 
-
-@connection
-async def add_sent_item(session, item_id: int, link, title: str, img_url: str, item_url: str):
-    try:
-        await enforce_limit_on_sent_items( link.id)
-        query = """
-            INSERT INTO sent_items (item_id, title, img_url, item_url, link_id)
-            SELECT :item_id, :title, :img_url, :item_url, :link_id
-            WHERE NOT EXISTS (
-                SELECT 1 FROM sent_items 
-                WHERE item_id = :item_id AND link_id = :link_id
+    Если передан high_water_mark, в той же транзакции сдвигает last_item_id ссылки.
+    notifications (ID товара -> строка outbox) ставятся в очередь в той же транзакции, но только для
+    действительно добавленных товаров: товар не может оказаться отправленным без уведомления.
+    album_window — как в add_notifications.
+    """
+    inserted = []
+    if items:
+        # Уже отправленные товары отбрасываются ограничением _item_link_uc
+        insert_query = (
+            sqlite_insert(SentItem)
+            .values([dict(item, link_id=link_id) for item in items])
+            .on_conflict_do_nothing(index_elements=[SentItem.item_id, SentItem.link_id])
+            .returning(SentItem.item_id)
+        )
+        inserted = list(await session.scalars(insert_query))
+        logging.info(f"Для Link ID {link_id} добавлено {len(inserted)} из {len(items)} товаров.")
+        if notifications:
+            added = set(inserted)
+            # Порядок уведомлений — порядок выдачи, а не порядок RETURNING
+            await _add_notifications(
+                session, [notification for item_id, notification in notifications.items() if item_id in added],
+                album_window,
             )
-        """
-        result = await session.execute(
-            text(query),
-            {
-                "item_id": item_id,
-                "title": title,
-                "img_url": img_url,
-                "item_url": item_url,
-                "link_id": link.id
-            }
+    if high_water_mark is not None:
+        await session.execute(
+            update(Link)
+            .where(Link.id == link_id)
+            .where((Link.last_item_id.is_(None)) | (Link.last_item_id < high_water_mark))
+            .values(last_item_id=high_water_mark)
         )
-        await session.commit()
-
-        if result.rowcount == 1:  # Успешная вставка
-            logging.info(f"SentItem с ID {item_id} успешно добавлен в Link ID {link.id}.")
-            return True
-        else:  # Вставка не была выполнена, так как запись уже существует
-            logging.info(f"SentItem с ID {item_id} уже существует в Link ID {link.id}.")
-            return False
-    except SQLAlchemyError as e:
-        logging.error(f"Ошибка при добавлении sent_item: {e}")
-        await session.rollback()
-        return None
+    return inserted
 
 
 @connection
@@ -100,6 +132,19 @@ async def get_all_users(session):
         logging.error(f"Ошибка при получении списка Users: {e}")
 
 
+@connection
+async def get_sent_item_ids(session):
+    """Возвращает пары (link_id, item_id) всех отправленных товаров от старых к новым."""
+    try:
+        result = await session.execute(
+            select(SentItem.link_id, SentItem.item_id).order_by(SentItem.created_at, SentItem.id)
+        )
+        return result.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при получении sent_items: {e}")
+        return None
+
+
 @connection
 async def delete_link(session, user_id: int, link: str):
     try:
@@ -111,8 +156,11 @@ async def delete_link(session, user_id: int, link: str):
             logging.warning(f"Ссылка '{link}' для пользователя {user_id} не найдена.")
             return False
 
+        link_id = link_to_delete.id
         await session.delete(link_to_delete)
+        session.add(LinkChange(user_id=user_id))
         await session.commit()
+        link_registry.remove_link(user_id, link_id)
         logging.info(f"Ссылка '{link}' успешно удалена для пользователя {user_id}.")
         return True
     except SQLAlchemyError as e:
@@ -121,6 +169,28 @@ async def delete_link(session, user_id: int, link: str):
         return False
 
 
+@connection
+async def suspend_links(session, link_ids: List[int], reason: str) -> List[tuple]:
+    """Приостанавливает опрос ссылок и возвращает (id, user_id, link) тех, что ещё не были приостановлены."""
+    try:
+        suspended = (await session.execute(
+            update(Link)
+            .where(Link.id.in_(link_ids), Link.is_suspended.is_(False))
+            .values(is_suspended=True, suspended_reason=reason)
+            .returning(Link.id, Link.user_id, Link.link)
+        )).all()
+        for user_id in {user_id for _, user_id, _ in suspended}:
+            session.add(LinkChange(user_id=user_id))
+        await session.commit()
+        for link_id, user_id, _ in suspended:
+            link_registry.remove_link(user_id, link_id)
+        return [tuple(row) for row in suspended]
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при приостановке ссылок {link_ids}: {e}")
+        await session.rollback()
+        return []
+
+
 @connection
 async def set_user_premium(session, user_id: int):
     try:
@@ -130,8 +200,10 @@ async def set_user_premium(session, user_id: int):
             return False
 
         user.is_premium = not user.is_premium
+        session.add(LinkChange(user_id=user_id))
         await session.commit()
         await session.refresh(user)
+        link_registry.set_premium(user_id, user.is_premium)
         # В транзакции изменения будут зафиксированы автоматически
         logging.info(f"User with ID {user_id} premium status changed to {user.is_premium}.")
         return user.is_premium
@@ -149,8 +221,13 @@ async def set_user_ban(session, user_id: int):
             return False
 
         user.is_banned = not user.is_banned
+        session.add(LinkChange(user_id=user_id))
         await session.commit()
         await session.refresh(user)
+        if user.is_banned:
+            link_registry.drop_user(user_id)
+        else:
+            await link_registry.reload_user(user_id)
         # В транзакции изменения будут зафиксированы автоматически
         logging.info(f"User with ID {user_id} Ban status changed to {user.is_banned}.")
         return user.is_banned
@@ -172,33 +249,314 @@ async def get_users_link_list(session, user_id: int):
         logging.error(f"Ошибка при получении пользователя с ID {user_id}: {e}")
         return None
 
+@write_connection
+async def trim_sent_items(session, free_limit: int, premium_limit: int):
+    """Оставляет у каждой ссылки только последние записи по лимиту тарифа владельца, за один проход."""
+    ranked = select(
+        SentItem.id,
+        SentItem.link_id,
+        func.row_number().over(
+            partition_by=SentItem.link_id,
+            order_by=(SentItem.created_at.desc(), SentItem.id.desc()),
+        ).label("position"),
+    ).subquery()
+    stale = (
+        select(ranked.c.id)
+        .join(Link, Link.id == ranked.c.link_id)
+        .join(User, User.user_id == Link.user_id)
+        .where(ranked.c.position > case((User.is_premium, premium_limit), else_=free_limit))
+    )
+    result = await session.execute(delete(SentItem).where(SentItem.id.in_(stale)))
+    logging.info(f"Удалено {result.rowcount} старых записей sent_items.")
+    return result.rowcount
+
+
+@write_connection
+async def incremental_vacuum(session):
+    """Возвращает файлу базы освободившиеся страницы в транзакции писателя, не пересекаясь с другими записями."""
+    pages = await session.scalar(text("PRAGMA freelist_count"))
+    raw = await session.connection()
+    cursor = await (await raw.get_raw_connection()).driver_connection.cursor()
+    try:
+        # sqlite3 делает один шаг PRAGMA incremental_vacuum за вызов — это одна освобождённая страница.
+        # executescript выполнил бы её до конца, но сначала зафиксировал бы открытую транзакцию писателя
+        for _ in range(pages):
+            await cursor.execute("PRAGMA incremental_vacuum")
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при incremental_vacuum: {e}")
+    finally:
+        await cursor.close()
+    return pages
+
+
+@write_connection
+async def trim_link_changes(session, max_age: float):
+    """Удаляет записи журнала link_changes старше max_age секунд: работающие скраперы их уже применили.
+
+    Последняя запись остаётся всегда: в таблицах, созданных без AUTOINCREMENT, по ней SQLite
+    продолжает нумерацию, а не начинает заново с 1.
+    """
+    result = await session.execute(
+        delete(LinkChange).where(
+            LinkChange.created_at < func.datetime("now", f"-{int(max_age)} seconds"),
+            LinkChange.id < select(func.max(LinkChange.id)).scalar_subquery(),
+        )
+    )
+    return result.rowcount
+
+
 @connection
-async def enforce_limit_on_sent_items(session, link_id: int, limit: int = 100):
-    """Удаляет старейшие записи, если их количество превышает указанный лимит."""
-    try:
-        # Подсчёт количества записей для данной ссылки
-        count_query = select(func.count(SentItem.id)).where(SentItem.link_id == link_id)
-        count_result = await session.scalar(count_query)
-        # Логирование количества записей перед любой операцией
-        logging.info(f"Количество записей для link_id {link_id} до проверки: {count_result}")
-        # Проверка, превышает ли количество записей лимит
-        if count_result > limit:
-            # Вычисляем количество записей, которые нужно удалить
-            excess_count = count_result - limit
-            # Подзапрос для получения ID старейших записей с сортировкой по created_at
-            subquery = (
-                select(SentItem.id)
-                .where(SentItem.link_id == link_id)
-                .order_by(SentItem.created_at.asc())
-                .limit(excess_count)
-            )
-            # Удаление записей по выбранным ID из подзапроса
-            delete_query = delete(SentItem).where(SentItem.id.in_(subquery))
-            delete_result = await session.execute(delete_query)
-            await session.commit()
-            logging.info(f"Удалено {delete_result.rowcount} старых записей для link_id {link_id}.")
+async def set_user_active(session, user_id: int, is_active: bool):
+    """Отмечает, можно ли отправлять пользователю сообщения (False — бот заблокирован)."""
+    try:
+        user = await session.scalar(select(User).filter_by(user_id=user_id))
+        if not user:
+            logging.warning(f"User with ID {user_id} not found.")
+            return False
+        user.is_active = is_active
+        session.add(LinkChange(user_id=user_id))
+        await session.commit()
+        if is_active:
+            await link_registry.reload_user(user_id)
         else:
-            logging.info(f"Количество записей для link_id {link_id} не превышает лимит в {limit}.")
+            link_registry.drop_user(user_id)
+        logging.info(f"User with ID {user_id} active status changed to {is_active}.")
+        return True
+    except SQLAlchemyError as e:
+        logging.error(f"Error changing active status for user {user_id}: {e}")
+        await session.rollback()
+        return None
+
+
+@write_connection
+async def add_notifications(session, notifications: List[dict], album_window: float = 0):
+    """Ставит уведомления в очередь outbox.
+
+    С album_window уведомления придерживаются, чтобы собраться в альбом: окно чата открывает самое
+    раннее из его ожидающих уведомлений (не дальше album_window вперёд), иначе оно начинается сейчас.
+    """
+    await _add_notifications(session, notifications, album_window)
+    return True
+
+
+async def _add_notifications(session, notifications: List[dict], album_window: float):
+    if album_window:
+        now = time.time()
+        send_after = {}
+        for chat_id in {notification["chat_id"] for notification in notifications}:
+            opened = await session.scalar(
+                select(func.min(Notification.send_after))
+                .where(Notification.chat_id == chat_id, Notification.send_after > now,
+                       Notification.send_after <= now + album_window)
+            )
+            send_after[chat_id] = opened if opened is not None else now + album_window
+        notifications = [dict(notification, send_after=send_after[notification["chat_id"]])
+                         for notification in notifications]
+    session.add_all(Notification(**notification) for notification in notifications)
+    await session.flush()
+
+
+@connection
+async def get_due_notifications(session, limit: int, exclude_chats=()):
+    """Возвращает уведомления, которые пора отправить, в порядке постановки в очередь."""
+    try:
+        now = time.time()
+        earlier = aliased(Notification)
+        # Сообщение не обгоняет более раннее сообщение того же чата, отложенное на повтор
+        blocked_by_earlier = (
+            exists()
+            .where(earlier.chat_id == Notification.chat_id, earlier.id < Notification.id, earlier.send_after > now)
+        )
+        result = await session.scalars(
+            select(Notification)
+            .where(Notification.send_after <= now, Notification.chat_id.not_in(exclude_chats), ~blocked_by_earlier)
+            .order_by(Notification.id)
+            .limit(limit)
+        )
+        return result.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при чтении outbox: {e}")
+        return []
+
+
+@write_connection
+async def delete_notifications(session, notification_ids: List[int]):
+    await session.execute(delete(Notification).where(Notification.id.in_(notification_ids)))
+
+
+@connection
+async def delete_chat_notifications(session, chat_id: int):
+    """Удаляет все уведомления чата, например если пользователь заблокировал бота."""
+    try:
+        result = await session.execute(delete(Notification).where(Notification.chat_id == chat_id))
+        await session.commit()
+        return result.rowcount
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при удалении уведомлений чата {chat_id}: {e}")
+        await session.rollback()
+        return 0
+
+
+@write_connection
+async def reschedule_notifications(session, notification_ids: List[int], delay: float, attempts: int):
+    await session.execute(
+        update(Notification)
+        .where(Notification.id.in_(notification_ids))
+        .values(send_after=time.time() + delay, attempts=attempts)
+    )
+
+
+@connection
+async def count_notifications(session):
+    try:
+        return await session.scalar(select(func.count(Notification.id)))
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при подсчёте outbox: {e}")
+        return None
+
+
+@connection
+async def create_broadcast(session, admin_id: int, text: str):
+    try:
+        total = await session.scalar(select(func.count(User.user_id)))
+        broadcast = Broadcast(admin_id=admin_id, text=text, total=total)
+        session.add(broadcast)
+        await session.commit()
+        await session.refresh(broadcast)
+        logging.info(f"Рассылка #{broadcast.id} создана, получателей: {total}.")
+        return broadcast.id
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при создании рассылки: {e}")
+        await session.rollback()
+        return None
+
+
+@connection
+async def get_broadcast(session, broadcast_id: int):
+    try:
+        return await session.get(Broadcast, broadcast_id)
     except SQLAlchemyError as e:
-        logging.error(f"Ошибка при ограничении записей: {e}")
-        await session.rollback()
\ No newline at end of file
+        logging.error(f"Ошибка при получении рассылки #{broadcast_id}: {e}")
+        return None
+
+
+@connection
+async def get_unfinished_broadcasts(session):
+    try:
+        result = await session.scalars(select(Broadcast.id).filter_by(is_finished=False).order_by(Broadcast.id))
+        return result.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при получении незавершённых рассылок: {e}")
+        return []
+
+
+@write_connection
+async def save_broadcast_progress(session, broadcast_id: int, cursor: int, delivered: int, blocked: int,
+                                  failed: int, is_finished: bool = False):
+    await session.execute(
+        update(Broadcast)
+        .where(Broadcast.id == broadcast_id)
+        .values(cursor=cursor, delivered=delivered, blocked=blocked, failed=failed, is_finished=is_finished)
+    )
+
+
+@connection
+async def get_user_ids_after(session, user_id: int, limit: int):
+    """Возвращает следующую порцию user_id по возрастанию — для рассылок с продолжением."""
+    try:
+        result = await session.scalars(
+            select(User.user_id).where(User.user_id > user_id).order_by(User.user_id).limit(limit)
+        )
+        return result.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при получении пользователей после {user_id}: {e}")
+        return None
+
+
+@write_connection
+async def save_scraper_status(session, worker_id: str, limiter: str, seen_index: str):
+    """Публикует состояние скрапера для команд админа в процессе бота (EMBEDDED_SCRAPER=false)."""
+    now = time.time()
+    values = {"limiter": limiter, "seen_index": seen_index, "reported_at": now}
+    await session.execute(
+        sqlite_insert(ScraperStatus)
+        .values(worker_id=worker_id, **values)
+        .on_conflict_do_update(index_elements=[ScraperStatus.worker_id], set_=values)
+    )
+    # Записи давно перезапущенных процессов больше не нужны
+    await session.execute(delete(ScraperStatus).where(ScraperStatus.reported_at < now - 86400))
+
+
+@connection
+async def get_scraper_statuses(session, max_age: float):
+    """Состояния скраперов, опубликованные не раньше max_age секунд назад."""
+    try:
+        result = await session.scalars(
+            select(ScraperStatus)
+            .where(ScraperStatus.reported_at >= time.time() - max_age)
+            .order_by(ScraperStatus.worker_id)
+        )
+        return result.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при получении состояния скраперов: {e}")
+        return []
+
+
+@write_connection
+async def sync_shard_leases(session, worker_id: str, shards: int, ttl: float, release_grace: float):
+    """Продлевает аренду партиций скрапера и перераспределяет их поровну между живыми процессами.
+
+    Возвращает список партиций, которыми теперь владеет worker_id.
+    """
+    now = time.time()
+    await session.execute(
+        sqlite_insert(ScraperWorker)
+        .values(worker_id=worker_id, heartbeat_at=now)
+        .on_conflict_do_update(index_elements=[ScraperWorker.worker_id], set_={"heartbeat_at": now})
+    )
+    await session.execute(delete(ScraperWorker).where(ScraperWorker.heartbeat_at < now - ttl))
+    await session.execute(
+        sqlite_insert(ShardLease)
+        .values([{"shard": shard, "expires_at": 0} for shard in range(shards)])
+        .on_conflict_do_nothing(index_elements=[ShardLease.shard])
+    )
+    live_workers = await session.scalar(select(func.count(ScraperWorker.worker_id)))
+    fair_share = math.ceil(shards / max(live_workers, 1))
+
+    owned = list(await session.scalars(
+        select(ShardLease.shard)
+        .where(ShardLease.owner == worker_id, ShardLease.expires_at >= now, ShardLease.shard < shards)
+        .order_by(ShardLease.shard)
+    ))
+    if len(owned) > fair_share:
+        # Лишние партиции отдаём не сразу: даём время закончиться уже начатым опросам
+        await session.execute(
+            update(ShardLease)
+            .where(ShardLease.shard.in_(owned[fair_share:]))
+            .values(owner=None, expires_at=now + release_grace)
+        )
+        owned = owned[:fair_share]
+    elif len(owned) < fair_share:
+        free = list(await session.scalars(
+            select(ShardLease.shard)
+            .where(ShardLease.expires_at < now, ShardLease.shard < shards)
+            .order_by(ShardLease.shard)
+            .limit(fair_share - len(owned))
+        ))
+        owned += free
+    if owned:
+        await session.execute(
+            update(ShardLease)
+            .where(ShardLease.shard.in_(owned))
+            .values(owner=worker_id, expires_at=now + ttl)
+        )
+    return sorted(owned)
+
+
+@write_connection
+async def release_shard_leases(session, worker_id: str):
+    """Освобождает партиции при штатной остановке процесса, чтобы их сразу подхватили другие."""
+    await session.execute(
+        update(ShardLease).where(ShardLease.owner == worker_id).values(owner=None, expires_at=0)
+    )
+    await session.execute(delete(ScraperWorker).where(ScraperWorker.worker_id == worker_id))
@@ -1,11 +1,44 @@
-from sqlalchemy import func
+from sqlalchemy import func, event
 from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
 
+from config_reader import config
+
 DATABASE_URL = "sqlite+aiosqlite:///first_database.db"
-engine = create_async_engine(DATABASE_URL)
+# Пул соединений для чтения (и редких записей из обработчиков команд)
+engine = create_async_engine(DATABASE_URL, pool_size=config.db_read_pool_size)
 async_session = async_sessionmaker(engine, class_=AsyncSession)
+# Единственное соединение для фонового писателя (data_base/writer.py)
+write_engine = create_async_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+write_session = async_sessionmaker(write_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Читатели не блокируют писателя и наоборот
+    cursor.execute("PRAGMA synchronous=NORMAL")  # В WAL этого достаточно для целостности
+    cursor.execute(f"PRAGMA busy_timeout={config.db_busy_timeout_ms}")
+    cursor.execute(f"PRAGMA cache_size=-{config.db_cache_size_kb}")
+    cursor.execute(f"PRAGMA mmap_size={config.db_mmap_size}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _disable_driver_transactions(dbapi_connection, connection_record):
+    # pysqlite сам управляет BEGIN и ломает SAVEPOINT — отдаём транзакции SQLAlchemy
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    # Писатель сразу берёт блокировку на запись, без повышения уровня посреди транзакции
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+event.listen(write_engine.sync_engine, "connect", _set_sqlite_pragmas)
+event.listen(write_engine.sync_engine, "connect", _disable_driver_transactions)
+event.listen(write_engine.sync_engine, "begin", _begin_immediate)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
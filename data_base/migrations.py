@@ -0,0 +1,66 @@
+import logging
+
+from sqlalchemy import text, inspect, select, update
+
+from data_base.database import engine, Base
+from data_base.models import Link
+from utils import convert_client_to_api_url, query_hash
+
+
+async def enable_incremental_vacuum():
+    """Переводит базу в режим auto_vacuum=INCREMENTAL (для существующей базы один раз нужен VACUUM)."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if await conn.scalar(text("PRAGMA auto_vacuum")) != 2:
+            await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            await conn.execute(text("VACUUM"))
+            logging.info("База переведена в режим auto_vacuum=INCREMENTAL.")
+
+
+def _add_missing_columns(sync_conn):
+    # create_all не добавляет новые колонки в уже существующие таблицы
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(sync_conn.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                if isinstance(default, str):
+                    default = f"'{default}'"
+                else:
+                    default = default.compile(dialect=sync_conn.dialect, compile_kwargs={"literal_binds": True})
+                ddl += f" DEFAULT {default}"
+            sync_conn.execute(text(ddl))
+            logging.info(f"Добавлена колонка {table.name}.{column.name}.")
+
+
+def _create_missing_indexes(sync_conn):
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _backfill_link_api_urls(sync_conn):
+    # Ссылки, добавленные до появления колонок api_url и query_hash
+    rows = sync_conn.execute(select(Link.id, Link.link).where(Link.api_url.is_(None), Link.link.is_not(None))).all()
+    for link_id, link in rows:
+        api_url = convert_client_to_api_url(link)
+        sync_conn.execute(
+            update(Link).where(Link.id == link_id).values(api_url=api_url, query_hash=query_hash(api_url))
+        )
+    if rows:
+        logging.info(f"Канонические API URL рассчитаны для {len(rows)} ссылок.")
+
+
+async def run_migrations():
+    """Идемпотентные изменения схемы для баз, созданных прошлыми версиями бота."""
+    async with engine.begin() as conn:
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+        await conn.run_sync(_backfill_link_api_urls)
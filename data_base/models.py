@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import Boolean, Integer, ForeignKey, BigInteger, String, UniqueConstraint
+from sqlalchemy import Boolean, Integer, ForeignKey, BigInteger, String, UniqueConstraint, Index, Float, true, false
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from data_base.database import Base
 
@@ -11,6 +11,7 @@ class User(Base):
     is_premium: Mapped[bool] = mapped_column(Boolean, default=False)  # Премиум статус
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)  # Администратор
     is_banned: Mapped[bool] = mapped_column(Boolean, default=False)  # Забанен
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default=true())  # Не заблокировал бота
     links: Mapped[list["Link"]] = relationship(
         "Link", back_populates="user", cascade="all, delete-orphan", lazy= "selectin"
     ) # Список ссылок пользователя
@@ -21,6 +22,11 @@ class Link(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # Уникальный ID ссылки
     user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"), nullable=False)  # ID пользователя
     link: Mapped[str] = mapped_column(String, nullable=True)  # URL ссылки
+    api_url: Mapped[str] = mapped_column(String, nullable=True)  # Канонический URL запроса к API Vinted
+    query_hash: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)  # Хэш api_url для группировки
+    last_item_id: Mapped[int] = mapped_column(BigInteger, nullable=True)  # Самый новый обработанный товар
+    is_suspended: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())  # Опрос остановлен
+    suspended_reason: Mapped[str] = mapped_column(String, nullable=True)  # Последняя ошибка перед остановкой
     # Связь с таблицей SentItem
     sent_items: Mapped[list["SentItem"]] = relationship(
         "SentItem", back_populates="link", cascade="all, delete-orphan"
@@ -39,4 +45,62 @@ class SentItem(Base):
     link: Mapped["Link"] = relationship("Link", back_populates="sent_items")# Связь с таблицей Link
     __table_args__ = (
         UniqueConstraint('item_id', 'link_id', name='_item_link_uc'),  # Добавлен составной уникальный индекс
-    )
\ No newline at end of file
+        Index('ix_sent_items_link_created', 'link_id', 'created_at'),  # Для очистки старых записей по ссылке
+    )
+
+
+class Notification(Base):
+    __tablename__ = "outbox"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # Порядок отправки
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)  # Кому отправить
+    photo: Mapped[str] = mapped_column(String, nullable=True)  # URL фото товара
+    caption: Mapped[str] = mapped_column(String, nullable=False)  # Текст уведомления (HTML)
+    button_url: Mapped[str] = mapped_column(String, nullable=True)  # Ссылка для кнопки "Show"
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # Неудачных попыток отправки
+    send_after: Mapped[float] = mapped_column(Float, default=0)  # Unix-время, раньше которого не отправлять
+    __table_args__ = (
+        Index('ix_outbox_send_after', 'send_after'),
+        Index('ix_outbox_chat_id', 'chat_id', 'id'),
+    )
+
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # Номер рассылки
+    admin_id: Mapped[int] = mapped_column(BigInteger, nullable=False)  # Кому слать прогресс и итог
+    text: Mapped[str] = mapped_column(String, nullable=False)  # Текст рассылки (MarkdownV2)
+    is_finished: Mapped[bool] = mapped_column(Boolean, default=False)  # Рассылка завершена
+    cursor: Mapped[int] = mapped_column(BigInteger, default=0)  # user_id, до которого всё отправлено
+    total: Mapped[int] = mapped_column(Integer, default=0)  # Получателей на момент запуска
+    delivered: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class LinkChange(Base):
+    __tablename__ = "link_changes"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # Порядок изменений
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)  # Чьи ссылки или статус изменились
+    # ID не переиспользуются после очистки журнала: иначе новые записи оказались бы позади курсоров скраперов
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+class ShardLease(Base):
+    __tablename__ = "shard_leases"
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)  # Номер партиции запросов
+    owner: Mapped[str] = mapped_column(String, nullable=True)  # ID процесса-скрапера, владеющего партицией
+    expires_at: Mapped[float] = mapped_column(Float, default=0)  # Unix-время окончания аренды
+
+
+class ScraperStatus(Base):
+    __tablename__ = "scraper_status"
+    worker_id: Mapped[str] = mapped_column(String, primary_key=True)  # ID процесса-скрапера
+    limiter: Mapped[str] = mapped_column(String, nullable=False, default="")  # Состояние лимитеров и прокси
+    seen_index: Mapped[str] = mapped_column(String, nullable=False, default="")  # Статистика индекса товаров
+    reported_at: Mapped[float] = mapped_column(Float, default=0)  # Когда опубликовано (Unix-время)
+
+
+class ScraperWorker(Base):
+    __tablename__ = "scraper_workers"
+    worker_id: Mapped[str] = mapped_column(String, primary_key=True)  # ID процесса-скрапера
+    heartbeat_at: Mapped[float] = mapped_column(Float, default=0)  # Последний признак жизни (Unix-время)
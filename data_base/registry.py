@@ -0,0 +1,152 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+
+from data_base.base import connection
+from data_base.models import User, Link, LinkChange
+
+
+@dataclass
+class Subscriber:
+    user_id: int
+    is_premium: bool
+    links: List[Link] = field(default_factory=list)
+
+
+class LinkRegistry:
+    """Ссылки активных (не забаненных и не заблокировавших бота) пользователей в памяти процесса.
+
+    Загружается один раз при старте скрапера. Изменения, сделанные через DAO в этом же процессе,
+    применяются сразу, а изменения из других процессов подтягиваются по журналу link_changes.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._cursor = 0  # Последний применённый LinkChange.id
+        self.loaded = False
+
+    def subscribers(self) -> List[Subscriber]:
+        return list(self._subscribers.values())
+
+    def put_user(self, user: User):
+        if user.is_banned or not user.is_active:
+            self.drop_user(user.user_id)
+            return
+        # Уже известные объекты Link сохраняем: в них актуальный last_item_id из памяти скрапера
+        known = {link.id: link for link in self._links_of(user.user_id)}
+        # Приостановленные после повторяющихся ошибок ссылки не опрашиваются (см. scraper/health.py)
+        links = [known.get(link.id, link) for link in user.links if not link.is_suspended]
+        self._subscribers[user.user_id] = Subscriber(user.user_id, user.is_premium, links)
+
+    def drop_user(self, user_id: int):
+        self._subscribers.pop(user_id, None)
+
+    def add_link(self, user_id: int, link: Link):
+        subscriber = self._subscribers.get(user_id)
+        if subscriber is not None and all(known.id != link.id for known in subscriber.links):
+            subscriber.links.append(link)
+
+    def remove_link(self, user_id: int, link_id: int):
+        subscriber = self._subscribers.get(user_id)
+        if subscriber is not None:
+            subscriber.links = [link for link in subscriber.links if link.id != link_id]
+
+    def set_premium(self, user_id: int, is_premium: bool):
+        subscriber = self._subscribers.get(user_id)
+        if subscriber is not None:
+            subscriber.is_premium = is_premium
+
+    def _links_of(self, user_id: int) -> List[Link]:
+        subscriber = self._subscribers.get(user_id)
+        return subscriber.links if subscriber is not None else []
+
+    async def load(self) -> bool:
+        """Полная загрузка при старте: все ссылки активных пользователей одним запросом."""
+        loaded = await _get_active_users()
+        if loaded is None:
+            return False
+        cursor, users = loaded
+        self._subscribers.clear()
+        for user in users:
+            self.put_user(user)
+        self._cursor = cursor
+        self.loaded = True
+        logging.info(f"Реестр ссылок загружен: пользователей {len(self._subscribers)}, "
+                     f"ссылок {sum(len(s.links) for s in self._subscribers.values())}")
+        return True
+
+    async def sync(self):
+        """Перечитывает только пользователей, упомянутых в журнале link_changes после курсора."""
+        changes = await _get_changed_users(self._cursor)
+        if not changes:
+            return
+        cursor, users = changes
+        if users is None:
+            # Нумерация журнала началась заново — изменения после курсора не отличить от старых
+            logging.warning(f"Журнал link_changes начат заново (курсор {self._cursor}), реестр перезагружается.")
+            await self.load()
+            return
+        for user_id, user in users.items():
+            if user is None:
+                self.drop_user(user_id)  # Пользователь удалён из базы
+            else:
+                self.put_user(user)
+        self._cursor = cursor
+
+    async def reload_user(self, user_id: int):
+        if not self.loaded:
+            return  # Скрапер работает в другом процессе — он узнает об изменении из link_changes
+        user = await _get_user(user_id)
+        if user is not None:
+            self.put_user(user)
+
+
+@connection
+async def _get_active_users(session):
+    try:
+        # Курсор читаем до пользователей, чтобы изменения между запросами применились при sync
+        cursor = await session.scalar(select(func.max(LinkChange.id)))
+        users = await session.scalars(select(User).where(User.is_banned.is_(False), User.is_active.is_(True)))
+        return cursor or 0, users.all()
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при загрузке реестра ссылок: {e}")
+        return None
+
+
+@connection
+async def _get_changed_users(session, cursor: int):
+    """Возвращает (новый курсор, {user_id: User или None}) по журналу link_changes после cursor.
+
+    Если последний ID журнала меньше курсора, вместо пользователей возвращается None: нужна полная загрузка.
+    """
+    try:
+        head = await session.scalar(select(func.max(LinkChange.id)))
+        if head is not None and head < cursor:
+            return head, None
+        changes = (await session.execute(
+            select(LinkChange.id, LinkChange.user_id).where(LinkChange.id > cursor).order_by(LinkChange.id)
+        )).all()
+        if not changes:
+            return None
+        users = dict.fromkeys(user_id for _, user_id in changes)
+        for user in await session.scalars(select(User).where(User.user_id.in_(list(users)))):
+            users[user.user_id] = user
+        return changes[-1][0], users
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при синхронизации реестра ссылок: {e}")
+        return None
+
+
+@connection
+async def _get_user(session, user_id: int):
+    try:
+        return await session.scalar(select(User).filter_by(user_id=user_id))
+    except SQLAlchemyError as e:
+        logging.error(f"Ошибка при обновлении пользователя {user_id} в реестре ссылок: {e}")
+        return None
+
+
+link_registry = LinkRegistry()
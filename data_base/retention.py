@@ -0,0 +1,16 @@
+import asyncio
+import logging
+
+from config_reader import config
+from data_base.dao import trim_sent_items, incremental_vacuum, trim_link_changes
+
+
+async def retention_compactor():
+    """Фоновая очистка sent_items: обрезает все ссылки до лимита тарифа и освобождает место в файле."""
+    while True:
+        await asyncio.sleep(config.retention_interval)
+        deleted = await trim_sent_items(config.sent_items_limit_free, config.sent_items_limit_premium)
+        if deleted:
+            await incremental_vacuum()
+            logging.info("Очистка sent_items завершена.")
+        await trim_link_changes(config.link_changes_retention)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from functools import wraps
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import metrics
+from config_reader import config
+from data_base.database import write_session
+
+Operation = Callable[[AsyncSession], Awaitable]
+
+
+class DatabaseWriter:
+    """Единственная корутина записи: собирает накопившиеся операции и выполняет их одной транзакцией."""
+
+    def __init__(self):
+        self._queue: asyncio.Queue[Optional[Tuple[Operation, asyncio.Future]]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, operation: Operation):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            entry = await self._queue.get()
+            # Забираем всё, что накопилось, пока выполнялся предыдущий пакет
+            while True:
+                if entry is None:
+                    stopping = True
+                else:
+                    batch.append(entry)
+                if stopping or len(batch) >= config.db_write_batch_size or self._queue.empty():
+                    break
+                entry = self._queue.get_nowait()
+            if batch:
+                await self._execute(batch)
+
+    async def _execute(self, batch: List[Tuple[Operation, asyncio.Future]]):
+        results = []
+        started = time.perf_counter()
+        try:
+            async with write_session() as session:
+                async with session.begin():
+                    for operation, future in batch:
+                        # Каждая операция в своём SAVEPOINT: ошибка одной (в том числе не из базы)
+                        # откатывает только её SAVEPOINT и достаётся только её вызывающему
+                        try:
+                            async with session.begin_nested():
+                                results.append((future, await operation(session), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+        except Exception as e:
+            logging.error(f"Ошибка пакетной записи в базу ({len(batch)} операций): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            metrics.db_write_batch_seconds.observe(time.perf_counter() - started)
+        for future, result, error in results:
+            if future.done():
+                continue  # Вызывающий уже отменил ожидание
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        """Дописывает всё, что уже поставлено в очередь, и останавливает писателя."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+
+db_writer = DatabaseWriter()
+
+
+def write_connection(func):
+    """Как @connection, но операция выполняется фоновым писателем в общей пакетной транзакции.
+
+    Функция не должна вызывать commit/rollback. При ошибке базы возвращается None,
+    остальные исключения операции получает только её вызывающий.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            with metrics.db_query_seconds.time(operation=func.__name__):
+                return await db_writer.submit(lambda session: func(session, *args, **kwargs))
+        except SQLAlchemyError as e:
+            logging.error(f"Ошибка при выполнении {func.__name__}: {e}")
+            return None
+
+    return wrapper
@@ -1,12 +1,15 @@
-import logging
+import time
 
 from aiogram import Router, F
-from aiogram.exceptions import TelegramRetryAfter, TelegramAPIError, TelegramNotFound, TelegramForbiddenError
 from aiogram.types import Message
 
+from config_reader import config
 from create_bot import admins, bot
 from data_base.base import connection
-from data_base.dao import get_all_users, set_user_premium, set_user_ban
+from data_base.dao import get_all_users, set_user_premium, set_user_ban, get_scraper_statuses
+from notifier.broadcast import start_broadcast
+from scraper.proxies import proxy_pool
+from scraper.seen_index import seen_index
 from utils import split_message
 
 admin_router = Router()
@@ -22,7 +25,9 @@ async def administration(message: Message):
             "/view_users - Show all users\n"
             "/send_message - Send a message to all users\n"
             "/grant_premium - Grant premium access to the user\n"
-            "/ban_user - Ban user"
+            "/ban_user - Ban user\n"
+            "/limiter_status - Show Vinted rate limiter state\n"
+            "/seen_index_stats - Show seen items index hit rate"
         )
         await message.answer(admin_text)
     else:
@@ -58,6 +63,51 @@ async def view_user(message: Message):
         await message.answer(part, parse_mode="Markdown")
 
 
+async def separate_scraper_report(field: str) -> str:
+    # Скрапер работает отдельно (scraper_service.py) и публикует своё состояние в таблицу scraper_status
+    statuses = await get_scraper_statuses(max_age=config.poll_refresh_interval * 4)
+    now = time.time()
+    return "\n\n".join(
+        f"[{status.worker_id}, {now - status.reported_at:.0f}s ago]\n{getattr(status, field)}"
+        for status in statuses if getattr(status, field)
+    )
+
+
+# /limiter_status handler
+@admin_router.message(F.text == "/limiter_status")
+async def limiter_status(message: Message):
+    user_id = message.chat.id
+    if user_id not in admins:
+        await message.answer("You are not an admin.")
+        return
+    if config.embedded_scraper:
+        report = proxy_pool.limiter_report()
+    else:
+        report = await separate_scraper_report("limiter")
+    if not report:
+        await message.answer("No requests to Vinted have been made yet.", parse_mode=None)
+        return
+    for part in split_message("Rate limiter:\n" + report):
+        await message.answer(part, parse_mode=None)
+
+
+# /seen_index_stats handler
+@admin_router.message(F.text == "/seen_index_stats")
+async def seen_index_stats(message: Message):
+    user_id = message.chat.id
+    if user_id not in admins:
+        await message.answer("You are not an admin.")
+        return
+    if config.embedded_scraper:
+        report = seen_index.stats()
+    else:
+        report = await separate_scraper_report("seen_index")
+    if not report:
+        await message.answer("No scraper has reported its state yet. Is scraper_service.py running?", parse_mode=None)
+        return
+    await message.answer(f"Seen index: {report}", parse_mode=None)
+
+
 @connection
 @admin_router.message(F.text.startswith("/grant_premium"))
 async def grant_user_premium(message: Message):
@@ -123,18 +173,9 @@ async def send_message(message: Message):
     if len(parts) < 2:
         await message.answer("Usage: /send_message <Text_message>", parse_mode=None)
         return
-    users = await get_all_users()
-    for user in users:
-        try:
-            await bot.send_message(chat_id=user.user_id, text=parts[1], parse_mode="MarkdownV2")
-            logging.info(f"Сообщение отправлено пользователю с ID {user.user_id}.")
-        except TelegramForbiddenError:
-            logging.warning(f"Бот заблокирован пользователем с ID {user.user_id}.")
-        except TelegramNotFound:
-            logging.warning(f"Чат с пользователем ID {user.user_id} не найден.")
-        except TelegramRetryAfter as e:
-            logging.warning(f"Превышен лимит запросов. Повторите через {e.retry_after} секунд.")
-        except TelegramAPIError as e:
-            logging.error(f"Ошибка Telegram API при отправке пользователю {user.user_id}: {e}")
-        except Exception as e:
-            logging.error(f"Непредвиденная ошибка при отправке сообщения пользователю {user.user_id}: {e}")
\ No newline at end of file
+    # Рассылка идёт в фоне, прогресс и итог придут отдельными сообщениями
+    broadcast_id = await start_broadcast(bot, user_id, parts[1])
+    if broadcast_id is None:
+        await message.answer("Could not start the broadcast.", parse_mode=None)
+        return
+    await message.answer(f"Broadcast #{broadcast_id} started.", parse_mode=None)
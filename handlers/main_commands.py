@@ -78,7 +78,10 @@ async def show_links(message: Message):
     if not user.links:
         await message.answer("You don't have any links added yet.")
         return
-    links_list = "\n".join(f"- {link.link}" for link in user.links)
+    links_list = "\n".join(
+        f"- ⏸ {link.link} (paused, add it again to resume)" if link.is_suspended else f"- {link.link}"
+        for link in user.links
+    )
     await message.answer(f"Your links:\n{links_list}")
 
 
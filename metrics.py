@@ -0,0 +1,253 @@
+import asyncio
+import bisect
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aiohttp import web
+
+from config_reader import config
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Sample = Tuple[str, Dict[str, str], float]  # (имя, метки, значение)
+Collector = Callable[[], Union[Iterable["Metric"], Awaitable[Iterable["Metric"]]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Метрика в текстовом формате Prometheus: значения хранятся по кортежу значений меток."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        for key, counts in self._counts.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, self._sums[key]))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class RateMeter:
+    """Скорость событий в секунду за скользящее окно (для метрик вида «ссылок в секунду»)."""
+
+    def __init__(self, window: float = 60):
+        self.window = window
+        self._events: deque = deque()  # (время, количество)
+
+    def add(self, count: float = 1):
+        self._events.append((time.monotonic(), count))
+
+    def rate(self) -> float:
+        threshold = time.monotonic() - self.window
+        while self._events and self._events[0][0] < threshold:
+            self._events.popleft()
+        return sum(count for _, count in self._events) / self.window
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        """Функция (или корутина), которая при каждом запросе /metrics возвращает свежие метрики."""
+        self._collectors.append(collector)
+
+    async def render(self) -> str:
+        metrics = list(self._metrics)
+        for collector in self._collectors:
+            try:
+                collected = collector()
+                if asyncio.iscoroutine(collected):
+                    collected = await collected
+                metrics.extend(collected)
+            except Exception as e:
+                logging.error(f"Ошибка при сборе метрик: {e}")
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Скрапер: запросы к Vinted
+vinted_fetch_seconds = registry.register(Histogram(
+    "vinted_fetch_seconds", "Latency of Vinted API requests.", ["domain"]))
+vinted_responses_total = registry.register(Counter(
+    "vinted_responses_total", "Vinted API responses by status code (error/timeout for failed requests).",
+    ["domain", "status"]))
+# Скрапер: опрос ссылок
+scraper_job_seconds = registry.register(Histogram(
+    "scraper_job_seconds", "Time to fetch, dedupe and enqueue one search query."))
+scraper_refresh_seconds = registry.register(Histogram(
+    "scraper_refresh_seconds", "Duration of one scheduler refresh cycle (registry sync and rescheduling)."))
+scraper_links_polled_total = registry.register(Counter(
+    "scraper_links_polled_total", "Links checked by the scraper."))
+scraper_links_polled_per_second = registry.register(Gauge(
+    "scraper_links_polled_per_second", "Links checked per second over the last minute."))
+scraper_scheduled_links = registry.register(Gauge(
+    "scraper_scheduled_links", "Links and unique queries scheduled by this process.", ["kind"]))
+scraper_pipeline_queued = registry.register(Gauge(
+    "scraper_pipeline_queued", "Poll jobs waiting for a pipeline worker."))
+scraper_egress_requests_total = registry.register(Counter(
+    "scraper_egress_requests_total", "Vinted requests by egress (direct or proxy) and health outcome.",
+    ["egress", "result"]))
+scraper_query_failures_total = registry.register(Counter(
+    "scraper_query_failures_total", "Failures caused by a search query itself (4xx, malformed JSON)."))
+scraper_links_suspended_total = registry.register(Counter(
+    "scraper_links_suspended_total", "Links suspended after repeated query failures."))
+links_polled = RateMeter()
+# База данных
+db_query_seconds = registry.register(Histogram(
+    "db_query_seconds", "Latency of DAO calls, including the wait for the batched writer.", ["operation"]))
+db_write_batch_seconds = registry.register(Histogram(
+    "db_write_batch_seconds", "Duration of one batched writer transaction."))
+# Telegram
+telegram_send_seconds = registry.register(Histogram(
+    "telegram_send_seconds", "Latency of Telegram sends for notifications.", ["kind"]))
+telegram_send_total = registry.register(Counter(
+    "telegram_send_total", "Notification sends by result.", ["result"]))
+
+
+def _collect_rates() -> List[Metric]:
+    scraper_links_polled_per_second.set(links_polled.rate())
+    return []
+
+
+registry.add_collector(_collect_rates)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=await registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+# Порты /metrics по умолчанию: у бота и отдельного скрапера разные, чтобы оба процесса могли работать на одном хосте
+BOT_METRICS_PORT = 9481
+SCRAPER_METRICS_PORT = 9482
+
+
+async def start_metrics_server(default_port: int) -> Optional[web.AppRunner]:
+    """Поднимает HTTP /metrics в формате Prometheus на METRICS_PORT или default_port; METRICS_PORT=0 отключает сервер."""
+    port = default_port if config.metrics_port is None else config.metrics_port
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.metrics_host, port).start()
+    except OSError as e:
+        # Порт занят (например, второй процесс скрапера с тем же METRICS_PORT) — работаем без метрик
+        logging.error(f"Не удалось запустить сервер метрик на {config.metrics_host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logging.info(f"Метрики доступны на http://{config.metrics_host}:{port}/metrics")
+    return runner
+
+
+async def stop_metrics_server(runner: Optional[web.AppRunner]):
+    if runner is not None:
+        await runner.cleanup()
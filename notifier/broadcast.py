@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramNotFound, TelegramAPIError
+
+from config_reader import config
+from data_base.dao import (create_broadcast, get_broadcast, get_unfinished_broadcasts, save_broadcast_progress,
+                           get_user_ids_after, set_user_active)
+from notifier.dispatcher import telegram_bucket
+
+DELIVERED, BLOCKED, FAILED = "delivered", "blocked", "failed"
+
+# Рассылки, которые выполняются сейчас: номер -> задача
+running_broadcasts: Dict[int, asyncio.Task] = {}
+
+
+async def _send_to_user(bot: Bot, user_id: int, text: str) -> str:
+    for attempt in range(config.broadcast_max_retries + 1):
+        await telegram_bucket.acquire()
+        try:
+            await bot.send_message(chat_id=user_id, text=text, parse_mode="MarkdownV2")
+            return DELIVERED
+        except TelegramRetryAfter as e:
+            # Ждём столько, сколько попросил Telegram, и пробуем снова
+            logging.warning(f"Превышен лимит запросов. Повтор для {user_id} через {e.retry_after} секунд.")
+            await asyncio.sleep(e.retry_after)
+        except (TelegramForbiddenError, TelegramNotFound):
+            logging.warning(f"Бот заблокирован пользователем с ID {user_id}.")
+            await set_user_active(user_id, False)
+            return BLOCKED
+        except TelegramAPIError as e:
+            logging.error(f"Ошибка Telegram API при отправке пользователю {user_id}: {e}")
+            return FAILED
+        except Exception as e:
+            # Любая другая ошибка не должна обрывать gather порции и всю рассылку
+            logging.error(f"Непредвиденная ошибка при отправке рассылки пользователю {user_id}: {e}")
+            return FAILED
+    return FAILED
+
+
+def _summary(broadcast_id: int, done: int, total: int, counters: Dict[str, int]) -> str:
+    return (
+        f"Broadcast #{broadcast_id}: {done}/{total} processed, "
+        f"delivered {counters[DELIVERED]}, blocked {counters[BLOCKED]}, failed {counters[FAILED]}"
+    )
+
+
+async def run_broadcast(bot: Bot, broadcast_id: int):
+    """Отправляет рассылку порциями, сохраняя курсор после каждой — после перезапуска она продолжится."""
+    broadcast = await get_broadcast(broadcast_id)
+    if not broadcast or broadcast.is_finished:
+        return
+    cursor = broadcast.cursor
+    counters = {DELIVERED: broadcast.delivered, BLOCKED: broadcast.blocked, FAILED: broadcast.failed}
+    last_report = time.monotonic()
+    while True:
+        user_ids = await get_user_ids_after(cursor, config.broadcast_chunk_size)
+        if user_ids is None:
+            await asyncio.sleep(config.broadcast_progress_interval)  # База недоступна — пробуем позже
+            continue
+        if not user_ids:
+            break
+        results = await asyncio.gather(*(_send_to_user(bot, user_id, broadcast.text) for user_id in user_ids))
+        for result in results:
+            counters[result] += 1
+        cursor = user_ids[-1]
+        await save_broadcast_progress(broadcast_id, cursor, **counters)
+        if time.monotonic() - last_report >= config.broadcast_progress_interval:
+            last_report = time.monotonic()
+            await _notify_admin(bot, broadcast.admin_id, _summary(broadcast_id, sum(counters.values()),
+                                                                   broadcast.total, counters))
+    await save_broadcast_progress(broadcast_id, cursor, **counters, is_finished=True)
+    logging.info(_summary(broadcast_id, sum(counters.values()), broadcast.total, counters))
+    await _notify_admin(bot, broadcast.admin_id,
+                        "Finished. " + _summary(broadcast_id, sum(counters.values()), broadcast.total, counters))
+
+
+async def _notify_admin(bot: Bot, admin_id: int, text: str):
+    try:
+        await bot.send_message(admin_id, text, parse_mode=None)
+    except TelegramAPIError as e:
+        logging.error(f"Ошибка при отправке прогресса рассылки админу {admin_id}: {e}")
+
+
+def _launch(bot: Bot, broadcast_id: int):
+    task = asyncio.create_task(run_broadcast(bot, broadcast_id))
+    running_broadcasts[broadcast_id] = task
+    task.add_done_callback(lambda _: running_broadcasts.pop(broadcast_id, None))
+
+
+async def start_broadcast(bot: Bot, admin_id: int, text: str):
+    """Создаёт рассылку и запускает её в фоне. Возвращает номер рассылки или None."""
+    broadcast_id = await create_broadcast(admin_id, text)
+    if broadcast_id is not None:
+        _launch(bot, broadcast_id)
+    return broadcast_id
+
+
+async def resume_broadcasts(bot: Bot):
+    """Продолжает рассылки, прерванные остановкой бота."""
+    for broadcast_id in await get_unfinished_broadcasts():
+        if broadcast_id not in running_broadcasts:
+            logging.info(f"Продолжаю рассылку #{broadcast_id}.")
+            _launch(bot, broadcast_id)
+
+
+async def stop_broadcasts():
+    tasks = list(running_broadcasts.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from aiogram import Bot, types
+from aiogram.exceptions import (TelegramRetryAfter, TelegramForbiddenError, TelegramNotFound,
+                                TelegramBadRequest, TelegramAPIError)
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import metrics
+from config_reader import config
+from data_base.dao import (get_due_notifications, delete_notifications, reschedule_notifications,
+                           delete_chat_notifications, set_user_active)
+from data_base.models import Notification
+from notifier.outbox import new_notifications
+from notifier.photo_cache import photo_cache
+from scraper.rate_limiter import TokenBucket
+
+ALBUM_SIZE = 10  # Максимум фото в одном send_media_group
+
+# Общий лимит Telegram на бота: его делят уведомления и рассылки
+telegram_bucket = TokenBucket(config.telegram_global_rps, config.telegram_global_burst)
+
+
+def largest_file_id(message: types.Message) -> Optional[str]:
+    # Telegram возвращает несколько размеров фото, последний — исходный
+    return message.photo[-1].file_id if message.photo else None
+
+
+class NotificationDispatcher:
+    """Отправляет уведомления из outbox с учётом общего лимита Telegram и лимита на чат."""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.global_bucket = telegram_bucket
+        self.chat_ready_at: Dict[int, float] = {}  # chat_id -> когда чату можно писать снова
+        self._active: Dict[int, asyncio.Task] = {}  # Чаты, которые сейчас отправляются
+
+    async def run(self):
+        try:
+            await self._loop()
+        finally:
+            # Отправки по чатам — отдельные задачи: без отмены они пережили бы остановку диспетчера
+            for task in list(self._active.values()):
+                task.cancel()
+            await asyncio.gather(*self._active.values(), return_exceptions=True)
+
+    async def _loop(self):
+        while True:
+            new_notifications.clear()
+            self._forget_idle_chats()
+            # Занятые и приостановленные чаты пропускаем, чтобы не нарушить порядок их сообщений
+            busy_chats = set(self._active) | set(self.chat_ready_at)
+            notifications = await get_due_notifications(config.outbox_batch_size, exclude_chats=busy_chats)
+            by_chat: Dict[int, List[Notification]] = defaultdict(list)
+            for notification in notifications:
+                by_chat[notification.chat_id].append(notification)
+            for chat_id, chat_notifications in by_chat.items():
+                # Один чат — одна задача, чтобы сохранить порядок сообщений внутри чата
+                task = asyncio.create_task(self._drain_chat(chat_id, chat_notifications))
+                self._active[chat_id] = task
+                task.add_done_callback(lambda _, chat_id=chat_id: self._on_chat_done(chat_id))
+            timeout = config.outbox_poll_interval
+            if self.chat_ready_at:
+                timeout = min(timeout, max(0.0, min(self.chat_ready_at.values()) - time.monotonic()))
+            try:
+                await asyncio.wait_for(new_notifications.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+    def _on_chat_done(self, chat_id: int):
+        self._active.pop(chat_id, None)
+        new_notifications.set()
+
+    def _forget_idle_chats(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, ready_at in self.chat_ready_at.items() if ready_at <= now]:
+            del self.chat_ready_at[chat_id]
+
+    async def _drain_chat(self, chat_id: int, notifications: List[Notification]):
+        for batch in self._batches(notifications):
+            delay = self.chat_ready_at.get(chat_id, 0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.global_bucket.acquire()
+            delivered = await self._deliver(chat_id, batch)
+            self.chat_ready_at[chat_id] = max(self.chat_ready_at.get(chat_id, 0),
+                                              time.monotonic() + config.telegram_chat_interval)
+            if not delivered:
+                break  # Остальные сообщения чата дождутся следующей попытки
+
+    @staticmethod
+    def _batches(notifications: List[Notification]) -> List[List[Notification]]:
+        """Разбивает сообщения чата на отправки: по одному или альбомами до ALBUM_SIZE фото."""
+        if not config.album_mode:
+            return [[notification] for notification in notifications]
+        batches = []
+        for notification in notifications:
+            if (notification.photo and batches and batches[-1][-1].photo
+                    and len(batches[-1]) < ALBUM_SIZE):
+                batches[-1].append(notification)
+            else:
+                batches.append([notification])
+        return batches
+
+    async def _deliver(self, chat_id: int, batch: List[Notification]) -> bool:
+        notification_ids = [notification.id for notification in batch]
+        kind = "album" if len(batch) > 1 else "single"
+        try:
+            with metrics.telegram_send_seconds.time(kind=kind):
+                if len(batch) > 1:
+                    await self._send_album(chat_id, batch)
+                else:
+                    await self._send(batch[0])
+            metrics.telegram_send_total.inc(result="delivered")
+        except TelegramRetryAfter as e:
+            metrics.telegram_send_total.inc(result="retry_after")
+            logging.warning(f"Превышен лимит запросов для чата {chat_id}. Повтор через {e.retry_after} секунд.")
+            self.chat_ready_at[chat_id] = time.monotonic() + e.retry_after
+            await reschedule_notifications(notification_ids, e.retry_after, max(n.attempts for n in batch))
+            return False
+        except (TelegramForbiddenError, TelegramNotFound):
+            metrics.telegram_send_total.inc(result="blocked")
+            logging.warning(f"Бот заблокирован пользователем с ID {chat_id}, уведомления отключены.")
+            await set_user_active(chat_id, False)
+            await delete_chat_notifications(chat_id)
+            return False
+        except TelegramBadRequest as e:
+            # Повтор не поможет: сообщение некорректно, отбрасываем его
+            metrics.telegram_send_total.inc(result="rejected")
+            logging.error(f"Уведомления {notification_ids} для {chat_id} отклонены Telegram: {e}")
+        except (TelegramAPIError, asyncio.TimeoutError) as e:
+            metrics.telegram_send_total.inc(result="error")
+            attempts = max(n.attempts for n in batch) + 1
+            if attempts < config.outbox_max_attempts:
+                logging.warning(f"Ошибка отправки уведомлений {notification_ids} ({e}), попытка {attempts}.")
+                self.chat_ready_at[chat_id] = time.monotonic() + 2 ** attempts
+                await reschedule_notifications(notification_ids, 2 ** attempts, attempts)
+                return False
+            logging.error(f"Уведомления {notification_ids} для {chat_id} не доставлены после {attempts} попыток: {e}")
+        await delete_notifications(notification_ids)
+        return True
+
+    async def _send(self, notification: Notification):
+        reply_markup = None
+        if notification.button_url:
+            builder = InlineKeyboardBuilder()
+            builder.row(types.InlineKeyboardButton(text="👀Show", url=notification.button_url))
+            reply_markup = builder.as_markup()
+        if notification.photo:
+            file_id = await photo_cache.acquire(notification.photo)
+            try:
+                message = await self.bot.send_photo(
+                    chat_id=notification.chat_id,
+                    photo=file_id or notification.photo,
+                    caption=notification.caption,
+                    reply_markup=reply_markup,
+                    parse_mode="HTML"
+                )
+                if file_id is None:
+                    photo_cache.release(notification.photo, largest_file_id(message))
+                return
+            except TelegramBadRequest as e:
+                if file_id is not None:
+                    # Сохранённый file_id больше не принимается — отправляем заново по URL
+                    photo_cache.invalidate(notification.photo)
+                    return await self._send(notification)
+                # Telegram не смог скачать фото с CDN — отправляем хотя бы текст
+                logging.warning(f"Не удалось отправить фото {notification.photo}: {e}")
+            finally:
+                if file_id is None:
+                    photo_cache.release(notification.photo)  # Ждущие отправки того же фото продолжат сами
+        await self.bot.send_message(
+            chat_id=notification.chat_id,
+            text=notification.caption,
+            reply_markup=reply_markup,
+            parse_mode="HTML"
+        )
+
+    async def _send_album(self, chat_id: int, batch: List[Notification]):
+        # Альбом не ждёт чужих первых отправок (иначе два альбома могли бы ждать друг друга)
+        media = [
+            types.InputMediaPhoto(media=photo_cache.get(notification.photo) or notification.photo,
+                                  caption=notification.caption, parse_mode="HTML")
+            for notification in batch
+        ]
+        try:
+            messages = await self.bot.send_media_group(chat_id=chat_id, media=media)
+        except TelegramBadRequest as e:
+            # Альбом отклонён (обычно из-за одного фото) — отправляем товары по отдельности.
+            # Доставленное сразу удаляется из outbox: при ошибке на следующем товаре
+            # _deliver перенесёт только оставшиеся, без повторов уже полученных сообщений
+            logging.warning(f"Не удалось отправить альбом в чат {chat_id}: {e}")
+            for notification in batch:
+                await self.global_bucket.acquire()
+                await self._send(notification)
+                await delete_notifications([notification.id])
+            return
+        for notification, message in zip(batch, messages):
+            file_id = largest_file_id(message)
+            if file_id:
+                photo_cache.put(notification.photo, file_id)
+        # Кнопки нельзя прикрепить к альбому, поэтому ссылки идут отдельным компактным сообщением
+        builder = InlineKeyboardBuilder()
+        for number, notification in enumerate(batch, start=1):
+            if notification.button_url:
+                builder.add(types.InlineKeyboardButton(text=f"👀{number}", url=notification.button_url))
+        builder.adjust(5)
+        await self.global_bucket.acquire()
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=f"👆 {len(batch)} new items", reply_markup=builder.as_markup())
+        except TelegramAPIError as e:
+            # Альбом уже доставлен, повторять его целиком нельзя
+            logging.error(f"Не удалось отправить ссылки к альбому в чат {chat_id}: {e}")
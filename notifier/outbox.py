@@ -0,0 +1,75 @@
+import asyncio
+import html
+import logging
+from typing import List
+
+import metrics
+from config_reader import config
+from data_base.dao import add_notifications, count_notifications
+from scraper.items import Item
+
+# Сигнал диспетчеру, что в outbox появились новые уведомления
+new_notifications = asyncio.Event()
+
+outbox_depth = metrics.Gauge("notifier_outbox_depth", "Notifications waiting in the outbox.")
+
+
+async def _collect_outbox_depth():
+    depth = await count_notifications()
+    if depth is None:
+        return []
+    outbox_depth.set(depth)
+    return [outbox_depth]
+
+
+metrics.registry.add_collector(_collect_outbox_depth)
+
+
+def build_caption(item: Item) -> str:
+    # Подпись уходит с parse_mode=HTML, а название и бренд пишет продавец: "<" или "&" сломали бы разметку
+    return (
+        f"™️ <b>{html.escape(item.brand or '—')}</b>\n"
+        f"💵 <b>{html.escape(item.price or '?')} {html.escape(item.currency or '')}</b>\n"
+        f"📌 <b>{html.escape(item.title)}</b>"
+    )
+
+
+def album_window() -> float:
+    # В режиме альбомов придерживаем уведомления, чтобы товары чата из одной волны ушли вместе
+    return config.album_window if config.album_mode else 0
+
+
+def item_notification(chat_id: int, item: Item) -> dict:
+    """Строка outbox с уведомлением о товаре."""
+    return {
+        "chat_id": chat_id,
+        "photo": item.photo,
+        "caption": build_caption(item),
+        "button_url": item.url,
+        "send_after": 0,
+    }
+
+
+async def items_queued(chat_id: int, items: List[Item]):
+    """Будит диспетчер, когда уведомления о товарах записаны в outbox вместе с sent_items."""
+    new_notifications.set()
+    logging.info(f"New items found for user {chat_id}: {len(items)}")
+
+
+# Постановка уведомлений о новых товарах в очередь outbox вместо отправки напрямую
+async def enqueue_items(chat_id: int, items: List[Item]) -> bool:
+    result = await add_notifications([item_notification(chat_id, item) for item in items],
+                                     album_window=album_window())
+    if result:
+        await items_queued(chat_id, items)
+    return result
+
+
+# Служебное сообщение пользователю через тот же outbox (сохраняет порядок с уведомлениями о товарах)
+async def enqueue_text(chat_id: int, text: str, button_url: str = None) -> bool:
+    result = await add_notifications([
+        {"chat_id": chat_id, "photo": None, "caption": html.escape(text), "button_url": button_url, "send_after": 0}
+    ])
+    if result:
+        new_notifications.set()
+    return result
@@ -0,0 +1,86 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import metrics
+from config_reader import config
+
+
+class PhotoCache:
+    """LRU-кэш: URL фото товара -> file_id Telegram после первой успешной отправки.
+
+    Фото с CDN Vinted Telegram скачивает заново при каждой отправке по URL, а по file_id
+    пересылает уже загруженный файл в любой чат. Пока фото отправляется первый раз,
+    остальные отправки того же URL ждут его file_id, а не скачивают фото параллельно.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._file_ids: OrderedDict[str, str] = OrderedDict()
+        self._uploads: Dict[str, asyncio.Future] = {}  # URL -> первая отправка, которая ещё идёт
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[str]:
+        """file_id без ожидания — для альбомов, которые отправляют несколько фото разом."""
+        file_id = self._file_ids.get(url)
+        if file_id is not None:
+            self._file_ids.move_to_end(url)
+            self.hits += 1
+        return file_id
+
+    async def acquire(self, url: str) -> Optional[str]:
+        """file_id для url или None — тогда вызывающий отправляет фото по URL и вызывает release()."""
+        if not self.size:
+            return None
+        while True:
+            file_id = self.get(url)
+            if file_id is not None:
+                return file_id
+            upload = self._uploads.get(url)
+            if upload is None:
+                self._uploads[url] = asyncio.get_running_loop().create_future()
+                self.misses += 1
+                return None
+            # Если первая отправка не удалась, file_id не появится и фото отправит следующий
+            await asyncio.shield(upload)
+
+    def release(self, url: str, file_id: Optional[str] = None):
+        """Завершает отправку по URL, начатую после acquire(); file_id сохраняется, если Telegram его вернул."""
+        if file_id:
+            self.put(url, file_id)
+        upload = self._uploads.pop(url, None)
+        if upload is not None and not upload.done():
+            upload.set_result(None)
+
+    def put(self, url: str, file_id: str):
+        if not self.size:
+            return
+        self._file_ids[url] = file_id
+        self._file_ids.move_to_end(url)
+        while len(self._file_ids) > self.size:
+            self._file_ids.popitem(last=False)
+
+    def invalidate(self, url: str):
+        """Забывает file_id, который Telegram отклонил."""
+        self._file_ids.pop(url, None)
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+
+photo_cache = PhotoCache(size=config.photo_cache_size)
+
+
+def _collect_photo_cache_metrics():
+    lookups = metrics.Counter("telegram_photo_cache_lookups_total",
+                              "Photo sends answered with a cached Telegram file_id (hit) or uploaded by URL (miss).",
+                              ["result"])
+    lookups.inc(photo_cache.hits, result="hit")
+    lookups.inc(photo_cache.misses, result="miss")
+    size = metrics.Gauge("telegram_photo_cache_size", "Photo URLs with a cached Telegram file_id.")
+    size.set(len(photo_cache))
+    return [lookups, size]
+
+
+metrics.registry.add_collector(_collect_photo_cache_metrics)
@@ -0,0 +1,58 @@
+import math
+from typing import Iterable, Optional, Tuple
+
+from config_reader import config
+
+
+class ArrivalEstimator:
+    """Скользящая оценка частоты появления новых товаров в выдаче запроса (товаров в секунду).
+
+    Новые товары и прошедшее время копятся с экспоненциальным затуханием (окно poll_rate_window),
+    поэтому оценка не зависит от того, с каким интервалом запрос опрашивался.
+    """
+    __slots__ = ("items", "seconds", "newest_id", "last_poll")
+
+    def __init__(self):
+        self.items = 0.0
+        self.seconds = 0.0
+        self.newest_id: Optional[int] = None
+        self.last_poll: Optional[float] = None
+
+    def observe(self, item_ids: Iterable[int], now: float):
+        item_ids = list(item_ids)
+        if self.last_poll is not None:
+            # После пустой выдачи новыми считаются все товары, а не только те, что новее отметки
+            newest_id = self.newest_id if self.newest_id is not None else -1
+            new_items = sum(1 for item_id in item_ids if item_id > newest_id)
+            elapsed = now - self.last_poll
+            decay = math.exp(-elapsed / config.poll_rate_window)
+            self.items = self.items * decay + new_items
+            self.seconds = self.seconds * decay + elapsed
+        self.last_poll = now
+        if item_ids:
+            self.newest_id = max(self.newest_id or 0, max(item_ids))
+
+    def rate(self) -> Optional[float]:
+        # Пока запрос наблюдается недолго, оценке не доверяем
+        if self.seconds < config.poll_rate_warmup:
+            return None
+        return self.items / self.seconds
+
+
+def plan_poll(tier_interval: float, rate: Optional[float]) -> Tuple[float, int]:
+    """Интервал опроса и per_page для запроса с оценкой частоты rate (товаров в секунду).
+
+    Интервал пропорционален 1/sqrt(rate): при фиксированном числе запросов так минимизируется
+    средняя задержка обнаружения товара. На частоте poll_reference_rate остаётся интервал тарифа,
+    а отклонение ограничено множителями poll_min_interval_factor и poll_max_interval_factor.
+    """
+    if rate is None or not config.poll_adaptive:
+        return tier_interval, config.poll_min_per_page
+    low = tier_interval * config.poll_min_interval_factor
+    high = tier_interval * config.poll_max_interval_factor
+    if rate <= 0:
+        return high, config.poll_min_per_page
+    interval = min(max(tier_interval * math.sqrt(config.poll_reference_rate / 3600 / rate), low), high)
+    # Страница с запасом вмещает товары, появившиеся за интервал, чтобы не уходить на следующие страницы
+    per_page = math.ceil(rate * interval * config.poll_per_page_headroom)
+    return interval, min(max(per_page, config.poll_min_per_page), config.poll_max_per_page)
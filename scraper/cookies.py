@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from typing import Optional, TYPE_CHECKING
+from urllib.parse import urlparse
+
+import aiohttp
+
+from config_reader import config
+from scraper.health import domain_health
+from utils import get_domain
+
+if TYPE_CHECKING:
+    from scraper.proxies import Egress
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+TOKEN_COOKIE = "access_token_web"
+
+
+async def _fetch_cookie(
+    baseurl: str, user_agent: str, egress: "Egress", retries: int = 3
+) -> tuple[str, Optional[int]]:
+    """Скачивает страницу Vinted через egress и возвращает Set-Cookie с токеном и его Max-Age (если указан)."""
+    response = None
+    for attempt in range(retries):
+        if egress.is_evicted(time.monotonic()):
+            break  # Исключённый прокси не опрашиваем — запрос повторят через другую точку
+        try:
+            await egress.limiter.acquire(baseurl)
+            started = time.perf_counter()
+            async with egress.session.get(baseurl, headers={"User-Agent": user_agent}, proxy=egress.proxy) as response:
+                egress.report(baseurl, response.status, response.headers.get("Retry-After"),
+                              time.perf_counter() - started)
+                if response.status == 200:
+                    session_cookie = ", ".join(response.headers.getall("Set-Cookie", []))
+                    if session_cookie and f"{TOKEN_COOKIE}=" in session_cookie:
+                        domain_health.record_success(baseurl)  # Домен отвечает, даже если поиск на нём отклоняется
+                        max_age = None
+                        morsel = response.cookies.get(TOKEN_COOKIE)
+                        if morsel is not None and morsel["max-age"].isdigit():
+                            max_age = int(morsel["max-age"])
+                        return session_cookie, max_age
+            await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
+        except aiohttp.ClientError as e:
+            egress.fail()
+            logging.error(f"Ошибка сети ({egress.name}): {e}. Попытка {attempt + 1} из {retries}.")
+            await asyncio.sleep(2 ** attempt)
+        except asyncio.TimeoutError:
+            egress.fail()
+            logging.error(f"Timeout on attempt {attempt + 1} ({egress.name})")
+
+    raise RuntimeError(
+        f"Не удалось получить cookie с {baseurl}. Статус: "
+        f"{response.status if response else 'неизвестен'}."
+    )
+
+
+class CookieStore:
+    """Кэш сессионных cookie по доменам Vinted с TTL и единственным обновлением на домен.
+
+    Cookie привязаны к IP, с которого получены, поэтому у каждого egress (прямое соединение
+    или прокси из scraper/proxies.py) свой CookieStore; egress назначает себя при создании.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.egress: Optional["Egress"] = None
+        self._cookies: dict[str, tuple[str, float]] = {}  # домен -> (cookie, момент истечения)
+        self._refreshing: dict[str, asyncio.Future] = {}
+
+    async def get(self, url: str, user_agent: str = USER_AGENT) -> str:
+        domain = get_domain(url)
+        cached = self._cookies.get(domain)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        # Все одновременные запросы к домену ждут одно и то же обновление
+        refresh = self._refreshing.get(domain)
+        if refresh is None:
+            refresh = asyncio.ensure_future(self._refresh(url, domain, user_agent))
+            self._refreshing[domain] = refresh
+            refresh.add_done_callback(lambda _: self._refreshing.pop(domain, None))
+        return await asyncio.shield(refresh)
+
+    async def _refresh(self, url: str, domain: str, user_agent: str) -> str:
+        parsed = urlparse(url)
+        cookie, max_age = await _fetch_cookie(f"{parsed.scheme}://{domain}/", user_agent, self.egress)
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age * 0.9)
+        self._cookies[domain] = (cookie, time.monotonic() + ttl)
+        logging.info(f"Cookie для {domain} ({self.egress.name}) обновлён, TTL {ttl:.0f} с.")
+        return cookie
+
+    def invalidate(self, url: str):
+        """Сбрасывает cookie домена, например после ответа 401/403."""
+        if self._cookies.pop(get_domain(url), None) is not None:
+            logging.info(f"Cookie для {get_domain(url)} сброшен.")
+
+    def clear(self):
+        self._cookies.clear()
+
+
+cookie_store = CookieStore(ttl=config.cookie_ttl)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Set
+
+import metrics
+from config_reader import config
+from data_base.dao import suspend_links
+from notifier.outbox import enqueue_text
+from scraper.scheduler import PollJob
+from utils import get_domain
+
+
+class LinkFailure(Exception):
+    """Ошибка самого поискового запроса (400/404/410, ответ не JSON), а не Vinted в целом."""
+
+
+class DomainHealth:
+    """Когда домен Vinted последний раз отвечал по существу: отказ запроса при живом домене — вина запроса.
+
+    Живым домен делают разобранная выдача, страница с cookie и явный отказ 400/404/410;
+    сетевые ошибки, таймауты, 429 и 5xx его здоровым не делают.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._last_success: Dict[str, float] = {}
+
+    def record_success(self, url: str):
+        self._last_success[get_domain(url)] = time.monotonic()
+
+    def is_healthy(self, url: str) -> bool:
+        last_success = self._last_success.get(get_domain(url))
+        return last_success is not None and time.monotonic() - last_success < self.window
+
+
+domain_health = DomainHealth(window=config.health_domain_window)
+
+# Приостановки выполняются в фоне; ссылки на задачи храним, чтобы их не собрал сборщик мусора
+_suspensions: Set[asyncio.Task] = set()
+
+
+def record_failure(job: PollJob, error: LinkFailure):
+    """Учитывает отказ запроса; при недоступном домене отказ не засчитывается ни одной ссылке."""
+    if not domain_health.is_healthy(job.url_api):
+        logging.warning(f"Запрос {job.url_api} не выполнен ({error}), но Vinted сейчас недоступен целиком.")
+        return
+    job.failures += 1
+    job.error = str(error)
+    metrics.scraper_query_failures_total.inc()
+    logging.warning(f"Запрос {job.url_api} не выполнен ({error}), отказов подряд: {job.failures}.")
+
+
+def should_suspend(job: PollJob) -> bool:
+    return job.failures >= config.health_suspend_after
+
+
+def schedule_suspension(job: PollJob, reschedule: Callable[[PollJob], None]):
+    """Приостанавливает ссылки задания в фоне; если ни одна не приостановлена, вызывает reschedule(job)."""
+    task = asyncio.create_task(_suspend(job, reschedule))
+    _suspensions.add(task)
+    task.add_done_callback(_suspensions.discard)
+
+
+async def _suspend(job: PollJob, reschedule: Callable[[PollJob], None]):
+    try:
+        suspended = await suspend_links([link.id for link in job.links], job.error)
+    except Exception as e:
+        logging.error(f"Не удалось приостановить ссылки запроса {job.url_api}: {e}")
+        suspended = []
+    if not suspended:
+        # Ошибка базы или ссылки уже приостановлены: запрос не должен выпасть из расписания
+        if job.parked:
+            reschedule(job)
+        return
+    metrics.scraper_links_suspended_total.inc(len(suspended))
+    logging.warning(f"Ссылки {[link_id for link_id, _, _ in suspended]} приостановлены: {job.error}")
+    for link_id, user_id, link in suspended:
+        await enqueue_text(
+            user_id,
+            f"⚠️ Tracking of this link is paused: Vinted keeps rejecting it ({job.error}).\n"
+            f"Check the search in your browser and add the link again to resume.",
+            button_url=link,
+        )
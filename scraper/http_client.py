@@ -0,0 +1,59 @@
+import logging
+from typing import Optional
+
+import aiohttp
+
+from config_reader import config
+
+
+def connector_options() -> dict:
+    """Параметры пула соединений, общие для прямого клиента и клиентов прокси."""
+    return dict(
+        limit=config.http_pool_limit,
+        limit_per_host=config.http_pool_limit_per_host,  # Отдельный пул на каждый домен Vinted
+        ttl_dns_cache=config.http_dns_cache_ttl,
+        keepalive_timeout=config.http_keepalive_timeout,
+    )
+
+
+def create_session(connector: Optional[aiohttp.BaseConnector] = None) -> aiohttp.ClientSession:
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=config.http_connect_timeout,
+        sock_read=config.http_read_timeout,
+    )
+    # Cookie передаём явно в заголовках, поэтому общий cookie jar не нужен
+    return aiohttp.ClientSession(
+        connector=connector or aiohttp.TCPConnector(**connector_options()),
+        timeout=timeout,
+        cookie_jar=aiohttp.DummyCookieJar(),
+    )
+
+
+class HttpClient:
+    """Общий долгоживущий HTTP-клиент скрапера: пул соединений, keep-alive и DNS-кэш."""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        if self._session is not None and not self._session.closed:
+            return self._session
+        self._session = create_session()
+        logging.info("HTTP-клиент скрапера запущен.")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info("HTTP-клиент скрапера закрыт.")
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTP-клиент скрапера не запущен. Вызовите http_client.start().")
+        return self._session
+
+
+http_client = HttpClient()
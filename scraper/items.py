@@ -0,0 +1,70 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+try:
+    import orjson  # Разбирает ответ в несколько раз быстрее json (есть в requirements.txt)
+except ImportError:
+    # Запасной вариант для установки без orjson: работает, но разбор медленнее
+    logging.warning("orjson не установлен, ответы Vinted разбираются модулем json.")
+    orjson = None
+
+
+@dataclass(slots=True)
+class Item:
+    """Товар из выдачи Vinted: только поля, которые нужны для дедупликации и уведомления."""
+    id: int
+    title: str
+    url: str
+    brand: Optional[str] = None
+    price: Optional[str] = None
+    currency: Optional[str] = None
+    photo: Optional[str] = None
+
+
+def loads(body: bytes):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def _text(value) -> Optional[str]:
+    """Строковое поле выдачи: число приводится к строке, null и составные значения дают None."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def parse_item(raw) -> Optional[Item]:
+    """Item из объекта выдачи или None, если нет ID, названия или ссылки.
+
+    Вложенные photo и total_item_price могут быть null — тогда соответствующие поля None.
+    Текстовые поля всегда str или None, даже если Vinted вернул, например, цену числом.
+    """
+    if not isinstance(raw, dict):
+        return None
+    item_id, title, url = raw.get("id"), _text(raw.get("title")), _text(raw.get("url"))
+    if type(item_id) is not int or not title or not url:
+        return None
+    price = raw.get("total_item_price") or raw.get("price")
+    if not isinstance(price, dict):
+        price = {}
+    photo = raw.get("photo")
+    return Item(
+        item_id,
+        title,
+        url,
+        _text(raw.get("brand_title")),
+        _text(price.get("amount")),
+        _text(price.get("currency_code")),
+        _text(photo.get("url")) if isinstance(photo, dict) else None,
+    )
+
+
+def parse_items(body: bytes) -> List[Item]:
+    """Разбирает тело ответа /api/v2/catalog/items; некорректный JSON вызывает ValueError."""
+    data = loads(body)
+    raw_items = data.get("items") if isinstance(data, dict) else None
+    # Исходные словари не сохраняются: после разбора страницы в памяти остаются только Item
+    return [item for item in map(parse_item, raw_items or ()) if item is not None]
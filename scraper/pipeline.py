@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import metrics
+from config_reader import config
+from data_base.models import Link
+from scraper.health import LinkFailure, record_failure
+from scraper.scheduler import PollJob
+
+
+class ScrapePipeline:
+    """Пул воркеров с ограниченной очередью: fetch -> dedupe -> notify, у каждой стадии свой лимит."""
+
+    def __init__(
+        self,
+        fetch: Callable[[str, List[Link], int], Awaitable[Optional[list]]],
+        dedupe: Callable[[list, Link], Awaitable[list]],
+        notify: Callable[[Link, list], Awaitable[None]],
+        on_done: Callable[[PollJob], None],
+    ):
+        self.fetch = fetch
+        self.dedupe = dedupe
+        self.notify = notify
+        self.on_done = on_done
+        # Ограниченная очередь даёт backpressure: планировщик ждёт, пока воркеры не освободятся
+        self.queue: asyncio.Queue[PollJob] = asyncio.Queue(maxsize=config.pipeline_queue_size)
+        self.fetch_slots = asyncio.Semaphore(config.pipeline_fetch_concurrency)
+        self.dedupe_slots = asyncio.Semaphore(config.pipeline_dedupe_concurrency)
+        self.notify_slots = asyncio.Semaphore(config.pipeline_notify_concurrency)
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(config.pipeline_workers)]
+
+    async def submit(self, job: PollJob):
+        await self.queue.put(job)
+        metrics.scraper_pipeline_queued.set(self.queue.qsize())
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            metrics.scraper_pipeline_queued.set(self.queue.qsize())
+            started = time.perf_counter()
+            try:
+                await self._process(job)
+            except Exception as e:
+                # Ошибка одного запроса не влияет на остальные задания
+                logging.error(f"An error occurred while checking {job.url_api}: {e}")
+            finally:
+                metrics.scraper_job_seconds.observe(time.perf_counter() - started)
+                metrics.scraper_links_polled_total.inc(len(job.links))
+                metrics.links_polled.add(len(job.links))
+                self.queue.task_done()
+                self.on_done(job)
+
+    async def _process(self, job: PollJob):
+        try:
+            async with self.fetch_slots:
+                items = await self.fetch(job.url_api, job.links, job.per_page)
+        except LinkFailure as e:
+            record_failure(job, e)
+            return
+        if items is not None:
+            job.failures = 0
+            job.record_poll(item.id for item in items)
+        if not items:
+            return
+        for link in job.links:
+            try:
+                async with self.dedupe_slots:
+                    new_items = await self.dedupe(items, link)
+                if new_items:
+                    async with self.notify_slots:
+                        await self.notify(link, new_items)
+            except Exception as e:
+                logging.error(f"An error occurred while processing link {link.id}: {e}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
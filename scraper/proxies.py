@@ -0,0 +1,226 @@
+import logging
+import time
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+import metrics
+from config_reader import config
+from scraper.cookies import CookieStore, cookie_store
+from scraper.http_client import connector_options, create_session, http_client
+from scraper.rate_limiter import RateLimiter, THROTTLE_STATUSES, rate_limiter
+
+try:
+    from aiohttp_socks import ProxyConnector  # Необязательная зависимость: нужна только для socks5:// и socks4://
+except ImportError:
+    ProxyConnector = None
+
+HTTP_PROXY_SCHEMES = ("http", "https")
+SOCKS_PROXY_SCHEMES = ("socks4", "socks5")
+# Нижняя граница задержки в оценке: прокси быстрее 50 мс между собой не различаем
+LATENCY_FLOOR = 0.05
+# Во сколько секунд оценка считает неудачный запрос: его приходится повторять через другую точку
+FAILURE_COST = 1.0
+
+
+def proxy_name(url: Optional[str]) -> str:
+    """Имя прокси для логов и метрик — без логина и пароля."""
+    if url is None:
+        return "direct"
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.hostname}:{parsed.port}"
+
+
+class Egress:
+    """Точка выхода запросов к Vinted: прямое соединение или прокси.
+
+    У каждой точки свой CookieStore (cookie привязаны к IP), свой RateLimiter (лимит Vinted
+    считается на IP) и оценка здоровья по задержке и доле ошибок.
+    """
+
+    def __init__(self, url: Optional[str], limiter: RateLimiter, cookies: CookieStore):
+        self.url = url
+        self.name = proxy_name(url)
+        self.limiter = limiter
+        self.cookies = cookies
+        cookies.egress = self  # Cookie этого хранилища запрашиваются через эту же точку
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.latency: Optional[float] = None  # Скользящая средняя задержки успешных запросов
+        self.error_rate = 0.0  # Скользящая доля ошибок
+        self.failures = 0  # Ошибок подряд
+        self.requests = 0
+        self.evicted_until = 0.0
+
+    @property
+    def scheme(self) -> Optional[str]:
+        return urlparse(self.url).scheme if self.url else None
+
+    @property
+    def proxy(self) -> Optional[str]:
+        """Значение proxy= для запроса aiohttp; SOCKS-прокси подключаются через коннектор сессии."""
+        return self.url if self.scheme in HTTP_PROXY_SCHEMES else None
+
+    async def start(self):
+        if self.url is None or (self._session is not None and not self._session.closed):
+            return
+        connector = None
+        if self.scheme in SOCKS_PROXY_SCHEMES:
+            connector = ProxyConnector.from_url(self.url, **connector_options())
+        self._session = create_session(connector)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self.url is None:
+            return http_client.session  # Прямое соединение использует общий клиент скрапера
+        if self._session is None or self._session.closed:
+            raise RuntimeError(f"Сессия прокси {self.name} не запущена. Вызовите proxy_pool.start().")
+        return self._session
+
+    def score(self) -> float:
+        """Чем больше, тем лучше: успешных запросов в секунду с учётом времени, потерянного на ошибки.
+
+        У ещё не опробованной точки задержка считается минимальной, чтобы она получила первые запросы.
+        Доля ошибок после исключения не сбрасывается, поэтому вернувшаяся точка остаётся ниже здоровых.
+        """
+        latency = max(self.latency or 0.0, LATENCY_FLOOR)
+        return (1 - self.error_rate) / (latency * (1 - self.error_rate) + FAILURE_COST * self.error_rate)
+
+    def is_evicted(self, now: float) -> bool:
+        return now < self.evicted_until
+
+    def report(self, url: str, status: int, retry_after: Optional[str], latency: float):
+        """Результат запроса: лимитеру для адаптации скорости и в оценку здоровья точки."""
+        self.limiter.report(url, status, retry_after)
+        # 429/403 означают, что Vinted ограничивает этот IP; 5xx часто отдаёт сам прокси
+        if status in THROTTLE_STATUSES or status >= 500:
+            self.fail()
+        else:
+            self._record(True, latency)
+
+    def fail(self):
+        """Сетевая ошибка, таймаут или ответ, говорящий о проблеме с этим IP."""
+        self._record(False, None)
+
+    def _record(self, ok: bool, latency: Optional[float]):
+        alpha = config.proxy_health_alpha
+        self.requests += 1
+        self.error_rate = self.error_rate * (1 - alpha) + (0.0 if ok else alpha)
+        metrics.scraper_egress_requests_total.inc(egress=self.name, result="ok" if ok else "error")
+        if ok:
+            self.failures = 0
+            self.latency = latency if self.latency is None else self.latency * (1 - alpha) + latency * alpha
+            return
+        self.failures += 1
+        if self.url is not None and (
+            self.failures >= config.proxy_evict_after
+            or (self.requests >= config.proxy_evict_after and self.error_rate >= config.proxy_evict_error_rate)
+        ):
+            self.evict()
+
+    def evict(self):
+        # После паузы точка возвращается с высокой долей ошибок: первая же ошибка снова её исключит
+        self.evicted_until = time.monotonic() + config.proxy_evict_seconds
+        self.failures = 0
+        logging.warning(
+            f"Прокси {self.name} исключён на {config.proxy_evict_seconds:.0f} с: "
+            f"доля ошибок {self.error_rate:.2f}, задержка {self.latency or 0:.2f} с."
+        )
+
+    def status(self) -> str:
+        evicted = max(0.0, self.evicted_until - time.monotonic())
+        return (
+            f"score {self.score():.1f}, errors {self.error_rate:.2f}, latency {self.latency or 0:.2f}s, "
+            f"requests {self.requests}" + (f", evicted {evicted:.0f}s" if evicted else "")
+        )
+
+
+class ProxyPool:
+    """Пул точек выхода: запрос уходит через лучшую по оценке точку, у которой есть свободный лимит."""
+
+    def __init__(self, urls: List[str], include_direct: bool):
+        self.egresses: List[Egress] = []
+        for url in urls:
+            scheme = urlparse(url).scheme
+            if scheme in SOCKS_PROXY_SCHEMES and ProxyConnector is None:
+                logging.error(f"Прокси {proxy_name(url)} пропущен: для SOCKS установите aiohttp-socks.")
+                continue
+            if scheme not in HTTP_PROXY_SCHEMES + SOCKS_PROXY_SCHEMES:
+                logging.error(f"Прокси {proxy_name(url)} пропущен: неизвестная схема {scheme!r}.")
+                continue
+            limiter = RateLimiter(rate=config.proxy_rate_limit_rps, burst=config.proxy_rate_limit_burst)
+            self.egresses.append(Egress(url, limiter, CookieStore(ttl=config.cookie_ttl)))
+        if include_direct or not self.egresses:
+            # Прямое соединение использует общие лимитер и cookie, как и без пула
+            self.egresses.insert(0, Egress(None, rate_limiter, cookie_store))
+
+    async def start(self):
+        for egress in self.egresses:
+            await egress.start()
+        if len(self.egresses) > 1 or self.egresses[0].url is not None:
+            logging.info(f"Пул прокси: {', '.join(egress.name for egress in self.egresses)}")
+
+    async def close(self):
+        for egress in self.egresses:
+            await egress.close()
+
+    def choose(self, url: str) -> Egress:
+        """Лучшая точка для запроса к url.
+
+        Исключённые точки пропускаются (если исключены все — берётся та, что вернётся раньше).
+        Из точек со свободным лимитом домена берётся лучшая по оценке, иначе та, что освободится раньше.
+        """
+        now = time.monotonic()
+        candidates = [egress for egress in self.egresses if not egress.is_evicted(now)]
+        if not candidates:
+            return min(self.egresses, key=lambda egress: egress.evicted_until)
+        return self._best(url, candidates)
+
+    def fallback(self, url: str, failed: Egress) -> Optional[Egress]:
+        """Другая неисключённая точка для повтора запроса, не прошедшего через failed, или None."""
+        now = time.monotonic()
+        candidates = [egress for egress in self.egresses if egress is not failed and not egress.is_evicted(now)]
+        return self._best(url, candidates) if candidates else None
+
+    @staticmethod
+    def _best(url: str, candidates: List[Egress]) -> Egress:
+        ready = [egress for egress in candidates if egress.limiter.delay(url) == 0]
+        if ready:
+            return max(ready, key=Egress.score)
+        return min(candidates, key=lambda egress: (egress.limiter.delay(url), -egress.score()))
+
+    def status(self) -> dict:
+        return {egress.name: egress.status() for egress in self.egresses}
+
+    def limiter_report(self) -> str:
+        """Лимитеры доменов по каждой точке выхода (для /limiter_status); пусто, пока запросов не было."""
+        sections = []
+        for egress in self.egresses:
+            status = egress.limiter.status()
+            if status:
+                limits = "\n".join(f"{domain}: {state}" for domain, state in status.items())
+                sections.append(f"{egress.name} ({egress.status()}):\n{limits}")
+        return "\n\n".join(sections)
+
+
+def _collect_proxy_metrics():
+    score = metrics.Gauge("scraper_egress_score", "Health score of each egress (success rate per second).",
+                          ["egress"])
+    evicted = metrics.Gauge("scraper_egress_evicted", "1 while an egress is evicted for failing.", ["egress"])
+    now = time.monotonic()
+    for egress in proxy_pool.egresses:
+        score.set(egress.score(), egress=egress.name)
+        evicted.set(int(egress.is_evicted(now)), egress=egress.name)
+    return [score, evicted]
+
+
+proxy_pool = ProxyPool(
+    urls=[url.strip() for url in config.proxies.split(",") if url.strip()],
+    include_direct=config.proxy_include_direct,
+)
+metrics.registry.add_collector(_collect_proxy_metrics)
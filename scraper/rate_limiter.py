@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict
+
+from config_reader import config
+from utils import get_domain
+
+THROTTLE_STATUSES = (429, 403)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket с AIMD: скорость падает при 429/403 и постепенно восстанавливается."""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0  # Сколько раз нас притормозили
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Ждём по очереди, чтобы запросы уходили в порядке поступления
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def delay(self) -> float:
+        """Через сколько секунд освободится токен (0 — можно отправлять сразу), без его списания."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def on_success(self):
+        # Аддитивное восстановление скорости до базовой
+        if self.rate < self.base_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.base_rate, self.rate + config.rate_limit_recovery_step)
+
+    def on_throttle(self, retry_after: Optional[float]):
+        # Мультипликативное снижение скорости и пауза на Retry-After
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(config.rate_limit_min_rps, self.rate * config.rate_limit_decrease_factor)
+        self.tokens = 0.0
+        pause = retry_after if retry_after is not None else config.rate_limit_default_backoff
+        self.blocked_until = max(self.blocked_until, now + pause)
+        self.throttled += 1
+
+    def status(self) -> str:
+        blocked = max(0.0, self.blocked_until - time.monotonic())
+        return (
+            f"{self.rate:.2f}/{self.base_rate:.2f} rps, tokens {self.tokens:.1f}/{self.burst}, "
+            f"paused {blocked:.0f}s, throttled {self.throttled}x"
+        )
+
+
+class RateLimiter:
+    """Ограничитель запросов к Vinted: отдельный token bucket на каждый домен."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _bucket(self, url: str) -> TokenBucket:
+        domain = get_domain(url)
+        if domain not in self._buckets:
+            self._buckets[domain] = TokenBucket(self.rate, self.burst)
+        return self._buckets[domain]
+
+    async def acquire(self, url: str):
+        await self._bucket(url).acquire()
+
+    def delay(self, url: str) -> float:
+        return self._bucket(url).delay()
+
+    def report(self, url: str, status: int, retry_after: Optional[str] = None):
+        """Сообщает лимитеру результат запроса для адаптации скорости."""
+        bucket = self._bucket(url)
+        if status in THROTTLE_STATUSES:
+            bucket.on_throttle(parse_retry_after(retry_after))
+            logging.warning(f"Vinted ограничивает {get_domain(url)} ({status}): {bucket.status()}")
+        elif status < 400:
+            bucket.on_success()
+
+    def status(self) -> Dict[str, str]:
+        return {domain: bucket.status() for domain, bucket in sorted(self._buckets.items())}
+
+
+rate_limiter = RateLimiter(rate=config.rate_limit_rps, burst=config.rate_limit_burst)
@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from config_reader import config
+from data_base.models import Link
+from scraper.arrival import ArrivalEstimator, plan_poll
+
+
+def tier_interval(is_premium: bool) -> float:
+    """Интервал опроса ссылки для тарифа пользователя."""
+    return config.poll_interval_premium if is_premium else config.poll_interval_free
+
+
+def backoff_interval(job: "PollJob") -> float:
+    """Интервал до следующего опроса: после отказов запроса растёт экспоненциально до health_max_backoff."""
+    if not job.failures:
+        return job.interval
+    return min(job.interval * 2 ** job.failures, max(config.health_max_backoff, job.interval))
+
+
+def with_jitter(interval: float) -> float:
+    # Случайный сдвиг, чтобы запросы не уходили пачками в одну и ту же секунду
+    return interval * (1 + random.uniform(-config.poll_jitter, config.poll_jitter))
+
+
+@dataclass
+class PollJob:
+    url_api: str
+    links: List[Link]
+    interval: float
+    due: float = 0.0
+    running: bool = False
+    parked: bool = False  # Снято с расписания до приостановки ссылок (см. park)
+    started: float = field(default=0.0, repr=False)
+    failures: int = 0  # Отказов запроса подряд (см. scraper/health.py)
+    error: str = ""
+    tier_interval: float = 0.0  # Интервал самого быстрого тарифа среди подписчиков
+    per_page: int = field(default_factory=lambda: config.poll_min_per_page)
+    arrival: ArrivalEstimator = field(default_factory=ArrivalEstimator, repr=False)
+
+    def __post_init__(self):
+        self.tier_interval = self.tier_interval or self.interval
+
+    def record_poll(self, item_ids: Iterable[int]):
+        """Учитывает успешный опрос и пересчитывает интервал и per_page по оценке частоты товаров."""
+        self.arrival.observe(item_ids, time.monotonic())
+        self.interval, self.per_page = plan_poll(self.tier_interval, self.arrival.rate())
+
+
+class PollScheduler:
+    """Очередь с приоритетом по времени следующего опроса каждого поискового запроса."""
+
+    def __init__(self, dispatch: Callable[[PollJob], Awaitable[None]]):
+        # dispatch может ждать (например, заполненную очередь воркеров) — это и есть backpressure
+        self.dispatch = dispatch
+        self.jobs: Dict[str, PollJob] = {}
+        self._queue: List[Tuple[float, int, str]] = []  # (due, порядковый номер, url_api)
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def update(self, queries: Dict[str, Tuple[List[Link], float]]):
+        """Синхронизирует задания с актуальным списком запросов: url_api -> (ссылки, интервал)."""
+        now = time.monotonic()
+        for url_api in list(self.jobs):
+            if url_api not in queries:
+                del self.jobs[url_api]  # Устаревшие записи в куче будут пропущены при извлечении
+        for url_api, (links, interval) in queries.items():
+            job = self.jobs.get(url_api)
+            if job is None:
+                job = self.jobs[url_api] = PollJob(url_api, links, interval)
+                # Первый опрос распределяем по интервалу, а не запускаем всё разом
+                self._push(job, now + random.uniform(0, interval * config.poll_jitter))
+                continue
+            if job.parked and {link.id for link in links} != {link.id for link in job.links}:
+                # На запрос подписались новые ссылки, которые ещё не приостановлены, — опрашиваем их заново
+                job.parked = False
+                job.failures = 0
+                self._push(job, now)
+            job.links = links
+            if interval < job.tier_interval and not job.running and job.due > now + interval:
+                self._push(job, now + interval)  # Тариф повысился — не ждём старый срок
+            if interval != job.tier_interval:
+                job.tier_interval = interval
+                job.interval, job.per_page = plan_poll(interval, job.arrival.rate())
+        self._wakeup.set()
+
+    def _push(self, job: PollJob, due: float):
+        job.due = due
+        heapq.heappush(self._queue, (due, next(self._counter), job.url_api))
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            while self._queue and self._queue[0][0] <= now:
+                due, _, url_api = heapq.heappop(self._queue)
+                job = self.jobs.get(url_api)
+                if job is None or job.running or job.due != due:
+                    continue
+                job.running = True
+                job.started = time.monotonic()
+                await self.dispatch(job)
+                now = time.monotonic()
+            timeout = self._queue[0][0] - now if self._queue else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def complete(self, job: PollJob):
+        """Вызывается после обработки задания: планирует следующий опрос запроса."""
+        job.running = False
+        job.parked = False
+        if self.jobs.get(job.url_api) is job:
+            self._push(job, max(time.monotonic(), job.started + with_jitter(backoff_interval(job))))
+            self._wakeup.set()
+
+    def park(self, job: PollJob):
+        """Снимает задание с расписания, пока его ссылки не уйдут из реестра (приостановка).
+
+        Если приостановка не состоялась, вызывающий возвращает задание в расписание через complete().
+        """
+        job.running = False
+        job.parked = True
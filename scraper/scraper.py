@@ -1,136 +1,268 @@
 import asyncio
 import logging
+import os
+import socket
+import time
+from collections import defaultdict
 
 import aiohttp
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 
-from aiogram import Bot, types
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select, exists
+import metrics
+from config_reader import config
+from data_base.dao import add_sent_items, save_scraper_status
+from data_base.models import Link
+from data_base.registry import Subscriber, link_registry
+from notifier.outbox import album_window, item_notification, items_queued
+from scraper.cookies import USER_AGENT
+from scraper.health import LinkFailure, domain_health, schedule_suspension, should_suspend
+from scraper.items import Item, parse_items
+from scraper.pipeline import ScrapePipeline
+from scraper.proxies import Egress, proxy_pool
+from scraper.scheduler import PollJob, PollScheduler, tier_interval
+from scraper.seen_index import seen_index, warm_seen_index
+from scraper.sharding import ShardManager, shard_of
+from utils import get_domain, is_newest_first, set_query_param
 
-from data_base.base import connection
-from data_base.dao import add_sent_item, get_users_link_list, get_all_users
-from data_base.models import SentItem
-from utils import convert_client_to_api_url
 
-
-async def _fetch_cookie(baseurl: str, user_agent: str, retries: int = 3) -> str:
-    for attempt in range(retries):
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(baseurl, headers={"User-Agent": user_agent}) as response:
-                    if response.status == 200:
-                        session_cookie = ", ".join(response.headers.getall("Set-Cookie"))
-                        if session_cookie and "access_token_web=" in session_cookie:
-                            return session_cookie
-                    await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
-        except aiohttp.ClientError as e:
-            logging.error(f"Ошибка сети: {e}. Попытка {attempt + 1} из {retries}.")
-            await asyncio.sleep(2 ** attempt)
-        except asyncio.TimeoutError:
-            logging.error(f"Timeout on attempt {attempt + 1}")
-
-    raise RuntimeError(
-        f"Не удалось получить cookie с {baseurl}. Статус: "
-        f"{response.status if response else 'неизвестен'}."
-    )
-
-
-async def fetch_data(url: str, headers: dict) -> Optional[dict]:
-    """Асинхронное получение данных с заданного URL."""
+async def fetch_data(url: str, headers: dict, egress: Egress) -> Optional[bytes]:
+    """Асинхронное получение тела ответа с заданного URL через egress (разбор — на стороне вызывающего)."""
+    domain = get_domain(url)
+    status = "error"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
+        await egress.limiter.acquire(url)
+        # Задержку считаем без ожидания лимитера — только сам запрос к Vinted
+        started = time.perf_counter()
+        with metrics.vinted_fetch_seconds.time(domain=domain):
+            async with egress.session.get(url, headers=headers, proxy=egress.proxy) as response:
+                status = response.status
+                egress.report(url, response.status, response.headers.get("Retry-After"),
+                              time.perf_counter() - started)
                 if response.status == 200:
-                    return await response.json()
+                    return await response.read()
+                elif response.status in (400, 404, 410):
+                    # Vinted отклоняет сам поисковый запрос — повтор его не исправит. Раз домен ответил,
+                    # он жив: иначе отказ единственного запроса на домене никогда бы не засчитывался
+                    domain_health.record_success(url)
+                    raise LinkFailure(f"HTTP {response.status}")
+                elif response.status == 429:
+                    logging.error(f"Ошибка: 429, Vinted ограничил частоту запросов к {url}.")
+                elif response.status in (401, 403):
+                    # Токен устарел или отозван: следующий запрос получит новый cookie
+                    egress.cookies.invalidate(url)
+                    logging.error(f"Ошибка: {response.status}, cookie сброшен.")
                 else:
                     logging.error(f"Ошибка: {response.status}, текст: {await response.text()}")
     except aiohttp.ClientError as e:
-        logging.error(f"Ошибка запроса: {e}")
-    except ValueError:
-        logging.error("Ответ не является JSON.")
+        egress.fail()
+        logging.error(f"Ошибка запроса ({egress.name}): {e}")
+    except asyncio.TimeoutError:
+        status = "timeout"
+        egress.fail()
+        logging.error(f"Timeout при запросе {url} ({egress.name})")
+    finally:
+        metrics.vinted_responses_total.inc(domain=domain, status=status)
     return None
 
 
-# Функция для обработки и вывода информации о товарах
-@connection
-async def parse_items(session, items_data: List[dict], user_id: int, link, bot: Bot) -> List[str]:
-    new_items = []
+# Отбор товаров, которые ещё не отправлялись по этой ссылке: они сохраняются в sent_items
+# вместе с уведомлениями о них в outbox
+async def filter_new_items(items_data: List[Item], link: Link) -> List[Item]:
     if not items_data:
         logging.info("Нет данных для обработки.")
-        return new_items
+        return []
 
+    candidates = {}
+    high_water_mark = link.last_item_id
+    # Отметка отсекает старое только в выдаче от новых к старым; в остальных порядках
+    # новый товар может стоять после старого — тогда остаются индекс и ограничение sent_items
+    newest_first = is_newest_first(link.api_url)
     for item in items_data:
-        item_id = item.get("id")
-        item_url = item.get("url")
-        item_photo = item.get("photo").get("url")
-        item_brand_title = item.get("brand_title")
-        item_title = item.get("title")
-        item_price = item.get("total_item_price").get("amount") +" "+ item.get("total_item_price").get("currency_code")
-        builder = InlineKeyboardBuilder()
-        builder.row(types.InlineKeyboardButton(text="👀Show", url=item_url))
-        if item_id and item_title and item_url:
-            # Проверка, есть ли этот товар уже в базе
-            async with session.begin():
-                existing_item = await session.scalar(
-                    select(exists().where(SentItem.item_id == item_id, SentItem.link_id == link.id))
-                )
-                if not existing_item:
-                    # Добавление нового элемента в базу данных
-                    result = await add_sent_item(item_id=item_id, link=link, title=item_title,
-                                                 img_url=item.get("photo", {}).get("url"), item_url=item_url)
-                    new_items.append(f"New item found: {item_title} - {item_url}")
-                    if result:
-                        formatted_string = (
-                            f"™️ <b>{item_brand_title}</b>\n"
-                            f"💵 <b>{item_price}</b>\n"
-                            f"📌 <b>{item_title}</b>"
-                        )
-                        # Отправить уведомление пользователю
-                        await bot.send_photo(
-                            chat_id=user_id,
-                            photo=item_photo,
-                            caption=formatted_string,
-                            reply_markup=builder.as_markup(),
-                            parse_mode="HTML"
-                        )
-    return new_items
-
-
-# Функция для получения товаров с сайта и проверки
-async def get_items_for_user(user_id: int, bot: Bot):
-    user = await get_users_link_list(user_id)
-    if not user or not user.links:
-        return
-
-    for link in user.links:
-        url_api = convert_client_to_api_url(link.link)  # Преобразование ссылки для API
-        baseurl = link.link  # Это исходная ссылка
-        user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-
-        session_cookie = await _fetch_cookie(baseurl, user_agent)
-        headers = {
-            "User-Agent": user_agent,
-            "Cookie": session_cookie,
+        item_id = item.id
+        if newest_first and link.last_item_id and item_id <= link.last_item_id:
+            break  # Дальше отметки всё уже обработано
+        high_water_mark = max(high_water_mark or 0, item_id)
+        # Уже виденные товары отсекаются в памяти без обращения к SQLite
+        if not seen_index.contains(link.id, item_id):
+            candidates[item_id] = item
+    if not candidates and high_water_mark == link.last_item_id:
+        return []
+
+    first_poll = link.last_item_id is None
+    notify = candidates
+    if first_poll:
+        # Новой ссылке — только первые товары выдачи, как раньше при per_page=10, даже если
+        # адаптивный опрос увеличил страницу общего запроса; остальные лишь отмечаются отправленными
+        first_ids = {item.id for item in items_data[:config.poll_min_per_page]}
+        notify = {item_id: item for item_id, item in candidates.items() if item_id in first_ids}
+    # Вся страница и уведомления о ней сохраняются одной транзакцией,
+    # база возвращает ID действительно новых товаров
+    inserted = await add_sent_items(link.id, [
+        {
+            "item_id": item_id,
+            "title": item.title,
+            "img_url": item.photo or "",
+            "item_url": item.url,
         }
+        for item_id, item in candidates.items()
+    ], high_water_mark=high_water_mark, notifications={
+        item_id: item_notification(link.user_id, item) for item_id, item in notify.items()
+    }, album_window=album_window())
+    if inserted is None:
+        return []
+    link.last_item_id = high_water_mark
+    for item_id in candidates:
+        seen_index.add(link.id, item_id)
+    inserted = set(inserted)
+    # Уведомления о них уже в outbox
+    return [item for item_id, item in notify.items() if item_id in inserted]
 
-        data = await fetch_data(url_api, headers)
-        if data:
-            new_items = await parse_items(data.get('items', []), user_id, link, bot)
-            if new_items:
-                logging.info(f"New items found for user {user_id}: {new_items}")
-        else:
-            logging.error("Ошибка при получении данных.")
 
+# Группировка ссылок подписчиков по итоговому API-запросу: url_api -> (ссылки, интервал опроса).
+# Реестр уже не содержит забаненных и заблокировавших бота пользователей
+def group_links_by_query(subscribers: List[Subscriber]) -> Dict[str, Tuple[List[Link], float]]:
+    links_by_query = defaultdict(list)
+    intervals = {}
+    for user in subscribers:
+        interval = tier_interval(user.is_premium)
+        for link in user.links:
+            url_api = link.api_url
+            if url_api is None:
+                continue  # Пустая ссылка: запрашивать нечего
+            links_by_query[url_api].append(link)
+            # Общий запрос опрашивается с частотой самого быстрого тарифа среди подписчиков
+            intervals[url_api] = min(interval, intervals.get(url_api, interval))
+    return {url_api: (links, intervals[url_api]) for url_api, links in links_by_query.items()}
 
-# Периодическая проверка новых товаров для всех пользователей
-async def periodic_check(bot: Bot):
-    while True:
-        all_users = await get_all_users()
-        tasks = [get_items_for_user(user.user_id, bot) for user in all_users]
+
+async def fetch_via(url_api: str, egress: Egress) -> Optional[bytes]:
+    try:
+        session_cookie = await egress.cookies.get(url_api)  # Cookie домена, полученный через тот же egress
+    except RuntimeError as e:
+        logging.error(f"Нет cookie для {url_api} через {egress.name}: {e}")
+        return None
+    headers = {
+        "User-Agent": USER_AGENT,
+        "Cookie": session_cookie,
+    }
+    return await fetch_data(url_api, headers, egress)
+
+
+async def fetch_page(url_api: str) -> Optional[List[Item]]:
+    egress = proxy_pool.choose(url_api)
+    body = await fetch_via(url_api, egress)
+    if not body:
+        # Без LinkFailure отказ обычно на стороне точки выхода (сеть, таймаут, 429/403 на её IP) —
+        # один повтор через другую, чтобы мёртвый прокси не стоил опроса
+        retry = proxy_pool.fallback(url_api, egress)
+        if retry is not None:
+            body = await fetch_via(url_api, retry)
+    if not body:
+        logging.error(f"Ошибка при получении данных для {url_api}.")
+        return None
+    try:
+        items = parse_items(body)
+    except ValueError:
+        raise LinkFailure("malformed JSON")
+    domain_health.record_success(url_api)
+    return items
+
+
+# Один запрос к Vinted на поисковый запрос, результаты раздаются всем подписанным ссылкам
+async def fetch_query(url_api: str, links: List[Link], per_page: Optional[int] = None) -> Optional[List[Item]]:
+    if per_page:
+        # Канонический URL (ключ запроса) всегда с per_page=10, размер страницы подбирает планировщик
+        url_api = set_query_param(url_api, "per_page", per_page)
+    items = await fetch_page(url_api)
+    if not items:
+        return items
+    # Листаем дальше, только если вся страница новее отметки самой отстающей ссылки,
+    # иначе всплеск больше одной страницы был бы потерян
+    if not is_newest_first(url_api):
+        return items  # По отметке можно листать только выдачу от новых к старым
+    marks = [link.last_item_id for link in links]
+    if None in marks:
+        return items  # У новой ссылки ещё нет отметки — первой страницы достаточно
+    floor = min(marks)
+    page_items = items
+    for page in range(2, config.poll_max_pages + 1):
+        if not all(item.id > floor for item in page_items):
+            break
         try:
-            await asyncio.gather(*tasks)
-        except Exception as e:
-            logging.error(f"An error occurred while gathering tasks: {e}")
+            page_items = await fetch_page(set_query_param(url_api, "page", page))
+        except LinkFailure as e:
+            # Первая страница уже получена — отказ дальней страницы не считается отказом запроса
+            logging.warning(f"Страница {page} запроса {url_api} недоступна: {e}")
+            break
+        if not page_items:
+            break
+        items.extend(page_items)
+    return items
+
+
+async def publish_status(worker_id: str):
+    # Бот, запущенный отдельно от скрапера, показывает это состояние в /limiter_status и /seen_index_stats
+    try:
+        await save_scraper_status(worker_id, proxy_pool.limiter_report(), seen_index.stats())
+    except Exception as e:
+        logging.error(f"Не удалось опубликовать состояние скрапера: {e}")
+
+
+# Периодическая проверка новых товаров для всех пользователей
+async def periodic_check(shards: Optional[ShardManager] = None):
+    """Опрашивает все запросы или, при шардировании, только партиции, арендованные этим процессом."""
+    scheduler = PollScheduler(lambda job: pipeline.submit(job))
+
+    def on_done(job: PollJob):
+        # Запрос, который раз за разом отклоняется при живом Vinted, больше не опрашивается
+        if should_suspend(job):
+            scheduler.park(job)
+            schedule_suspension(job, reschedule=scheduler.complete)
+        else:
+            scheduler.complete(job)
+
+    async def fetch_owned(url_api: str, links: List[Link], per_page: int):
+        # Аренда могла истечь, пока задание стояло в очереди — тогда запрос уже опрашивает другой процесс
+        if shards is not None and not shards.owns(links[0].query_hash):
+            return None
+        return await fetch_query(url_api, links, per_page)
 
-        await asyncio.sleep(15)
+    # У каждой ссылки своя история sent_items, поэтому дедупликация остаётся раздельной
+    pipeline = ScrapePipeline(
+        fetch=fetch_owned,
+        dedupe=filter_new_items,
+        notify=lambda link, items: items_queued(link.user_id, items),
+        on_done=on_done,
+    )
+    worker_id = shards.worker_id if shards is not None else f"{socket.gethostname()}-{os.getpid()}"
+    await warm_seen_index()
+    pipeline.start()
+    runner = asyncio.create_task(scheduler.run())
+    try:
+        while True:
+            with metrics.scraper_refresh_seconds.time():
+                # Реестр загружается из базы один раз, дальше читаются только новые записи link_changes
+                if link_registry.loaded:
+                    await link_registry.sync()
+                else:
+                    await link_registry.load()
+                if link_registry.loaded:
+                    queries = group_links_by_query(link_registry.subscribers())
+                    if shards is not None:
+                        owned = await shards.refresh()
+                        queries = {url_api: (links, interval) for url_api, (links, interval) in queries.items()
+                                   if shard_of(links[0].query_hash, shards.shards) in owned}
+                    link_count = sum(len(links) for links, _ in queries.values())
+                    logging.info(f"Ссылок: {link_count}, уникальных запросов: {len(queries)}")
+                    metrics.scraper_scheduled_links.set(link_count, kind="links")
+                    metrics.scraper_scheduled_links.set(len(queries), kind="queries")
+                    scheduler.update(queries)
+                    seen_index.retain(link.id for links, _ in queries.values() for link in links)
+            if not config.embedded_scraper:
+                await publish_status(worker_id)
+            await asyncio.sleep(config.poll_refresh_interval)
+    finally:
+        runner.cancel()
+        await pipeline.stop()
+        if shards is not None:
+            await shards.release()
@@ -0,0 +1,79 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+import metrics
+from config_reader import config
+from data_base.dao import get_sent_item_ids
+
+
+class SeenIndex:
+    """Последние item_id каждой ссылки в памяти, чтобы уже виденные товары не проверялись в SQLite."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._items: Dict[int, OrderedDict] = {}  # link_id -> item_id в порядке добавления
+        self.hits = 0
+        self.misses = 0
+
+    def contains(self, link_id: int, item_id: int) -> bool:
+        if item_id in self._items.get(link_id, ()):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, link_id: int, item_id: int):
+        items = self._items.setdefault(link_id, OrderedDict())
+        items[item_id] = None
+        items.move_to_end(item_id)
+        # Храним не меньше, чем фоновая очистка оставляет в базе для любого тарифа
+        while len(items) > self.limit:
+            items.popitem(last=False)
+
+    def load(self, rows: Iterable[Tuple[int, int]]):
+        """Заполняет индекс парами (link_id, item_id), отсортированными от старых к новым."""
+        self._items.clear()
+        for link_id, item_id in rows:
+            self.add(link_id, item_id)
+
+    def retain(self, link_ids: Iterable[int]):
+        # Удаляем ссылки, которых больше нет, чтобы их ID не унаследовала новая ссылка
+        active = set(link_ids)
+        for link_id in list(self._items):
+            if link_id not in active:
+                del self._items[link_id]
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        entries = sum(len(items) for items in self._items.values())
+        return (
+            f"links {len(self._items)}, items {entries}, "
+            f"hits {self.hits}, misses {self.misses}, hit rate {hit_rate:.1f}%"
+        )
+
+
+seen_index = SeenIndex(limit=max(config.sent_items_limit_free, config.sent_items_limit_premium))
+
+
+def _collect_seen_index_metrics():
+    lookups = metrics.Counter("seen_index_lookups_total", "Seen index lookups by result.", ["result"])
+    lookups.inc(seen_index.hits, result="hit")
+    lookups.inc(seen_index.misses, result="miss")
+    total = seen_index.hits + seen_index.misses
+    hit_ratio = metrics.Gauge("seen_index_hit_ratio", "Share of seen index lookups answered from memory.")
+    hit_ratio.set(seen_index.hits / total if total else 0)
+    return [lookups, hit_ratio]
+
+
+metrics.registry.add_collector(_collect_seen_index_metrics)
+
+
+async def warm_seen_index():
+    """Загружает индекс из таблицы sent_items при старте скрапера."""
+    rows = await get_sent_item_ids()
+    if rows is None:
+        return
+    seen_index.load(rows)
+    logging.info(f"Индекс просмотренных товаров загружен: {seen_index.stats()}")
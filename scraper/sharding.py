@@ -0,0 +1,46 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Set
+
+from config_reader import config
+from data_base.dao import sync_shard_leases, release_shard_leases
+
+
+def shard_of(query_hash: int, shards: int) -> int:
+    """Стабильный номер партиции запроса (по Link.query_hash): одинаковые запросы всегда у одного процесса."""
+    return query_hash % shards
+
+
+class ShardManager:
+    """Аренда партиций запросов через таблицу shard_leases для нескольких процессов-скраперов."""
+
+    def __init__(self, shards: int, worker_id: str = None):
+        self.shards = shards
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.owned: Set[int] = set()
+        self.valid_until = 0.0
+
+    async def refresh(self) -> Set[int]:
+        started = time.time()
+        owned = await sync_shard_leases(self.worker_id, self.shards, config.shard_lease_ttl,
+                                        config.shard_release_grace)
+        if owned is None:
+            logging.error(f"Не удалось продлить аренду партиций для {self.worker_id}.")
+        else:
+            if set(owned) != self.owned:
+                logging.info(f"Скрапер {self.worker_id} владеет партициями {owned} из {self.shards}.")
+            self.owned = set(owned)
+            # Считаем аренду истёкшей раньше, чем в базе, чтобы не пересечься с новым владельцем
+            self.valid_until = started + config.shard_lease_ttl - config.poll_refresh_interval
+        return self.owned if time.time() < self.valid_until else set()
+
+    def owns(self, query_hash: int) -> bool:
+        return time.time() < self.valid_until and shard_of(query_hash, self.shards) in self.owned
+
+    async def release(self):
+        self.owned = set()
+        self.valid_until = 0.0
+        await release_shard_leases(self.worker_id)
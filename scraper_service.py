@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import signal
+from typing import List, Optional
+
+from config_reader import config
+from data_base.base import create_tables
+from data_base.retention import retention_compactor
+from data_base.writer import db_writer
+from metrics import SCRAPER_METRICS_PORT, start_metrics_server, stop_metrics_server
+from scraper.http_client import http_client
+from scraper.proxies import proxy_pool
+from scraper.scraper import periodic_check
+from scraper.sharding import ShardManager
+
+
+# Запуск скрапера: общий HTTP-клиент, опрос ссылок и очистка sent_items
+async def start_scraper(shards: Optional[ShardManager] = None) -> List[asyncio.Task]:
+    await http_client.start()
+    await proxy_pool.start()
+    return [
+        asyncio.create_task(periodic_check(shards)),
+        asyncio.create_task(retention_compactor()),
+    ]
+
+
+async def stop_scraper(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await proxy_pool.close()
+    await http_client.close()
+
+
+# Отдельный процесс скрапера: уведомления он только кладёт в outbox,
+# а отправляет их процесс бота (bot.py с EMBEDDED_SCRAPER=false).
+# При SCRAPER_SHARDS > 0 можно запустить несколько таких процессов: запросы делятся
+# между ними через аренду партиций, а партиции упавшего процесса забирают остальные
+async def main():
+    await create_tables()
+    shards = ShardManager(config.scraper_shards) if config.scraper_shards > 0 else None
+    metrics_server = await start_metrics_server(SCRAPER_METRICS_PORT)
+    tasks = await start_scraper(shards)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    logging.info("Скрапер запущен.")
+    try:
+        await stopped.wait()
+    finally:
+        await stop_scraper(tasks)
+        await db_writer.stop()  # Дописываем накопившиеся изменения до выхода
+        await stop_metrics_server(metrics_server)
+        logging.info("Скрапер остановлен.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
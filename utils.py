@@ -1,3 +1,4 @@
+import hashlib
 import urllib.parse
 
 from aiogram.fsm.state import StatesGroup, State
@@ -17,6 +18,10 @@ def escape_url(url: str) -> str:
     # Применяем URL-кодирование, экранируя все символы, кроме стандартных для URL
     return urllib.parse.quote(url, safe=":/?&=.%")
 
+def get_domain(url: str) -> str:
+    # Домен Vinted (www.vinted.fr, www.vinted.pl, ...) из ссылки
+    return urllib.parse.urlparse(url).netloc
+
 def split_message(text, max_length=4000):
     """Разбивает длинное сообщение на части."""
     parts = []
@@ -30,15 +35,27 @@ def split_message(text, max_length=4000):
     return parts
 
 
-from urllib.parse import urlencode, urlparse, parse_qs
+from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
+
+
+def set_query_param(url: str, name: str, value) -> str:
+    # Заменяет (или добавляет) один параметр запроса, сохраняя остальные
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query, keep_blank_values=True)
+    query_params[name] = [str(value)]
+    return urlunparse(parsed_url._replace(query=urlencode(query_params, doseq=True)))
 
 
 def convert_client_to_api_url(client_url):
-    # Парсим URL
-    parsed_url = urlparse(client_url)
+    """Канонический API URL поиска: одинаковые поиски дают одну и ту же строку.
+
+    Порядок и повторы параметров, экранирование, регистр домена и номер страницы не влияют на результат.
+    """
+    # Парсим URL (parse_qs заодно снимает URL-кодирование значений)
+    parsed_url = urlparse(client_url.strip())
     query_params = parse_qs(parsed_url.query)
 
-    # Определяем соответствие параметров
+    # Определяем соответствие параметров; page не переносим — страницы листает сам скрапер
     param_map = {
         "search_text": "search_text",
         "catalog[]": "catalog_ids",
@@ -52,12 +69,11 @@ def convert_client_to_api_url(client_url):
         "currency": "currency",
         "order": "order",
         "time": "time",
-        "page": "page",
     }
 
     # Базовые параметры API
     api_params = {
-        "page": query_params.get("page", ["1"])[0],
+        "page": "1",
         "per_page": "10",
     }
 
@@ -65,15 +81,26 @@ def convert_client_to_api_url(client_url):
     for client_param, api_param in param_map.items():
         if client_param in query_params:
             if client_param.endswith("[]"):  # Массивы преобразуем в строку через запятую
-                api_params[api_param] = ",".join(query_params[client_param])
+                # Сортируем значения, чтобы одинаковые поиски давали одинаковый API URL
+                api_params[api_param] = ",".join(sorted(set(query_params[client_param])))
             else:  # Одиночные параметры сохраняем как есть
-                api_params[api_param] = query_params[client_param][0]
+                api_params[api_param] = query_params[client_param][0].strip()
 
-    # Особая обработка search_text (замена %20 на +)
+    # Лишние пробелы в поисковой строке не меняют выдачу
     if "search_text" in api_params:
-        api_params["search_text"] = api_params["search_text"].replace("%20", "+")
+        api_params["search_text"] = " ".join(api_params["search_text"].split())
 
     # Генерация API ссылки с динамическим доменом
-    api_base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/api/v2/catalog/items"
+    api_base_url = f"{parsed_url.scheme.lower()}://{parsed_url.netloc.lower()}/api/v2/catalog/items"
     api_url = f"{api_base_url}?{urlencode(api_params)}"
     return api_url
+
+
+def is_newest_first(api_url: str) -> bool:
+    # Только с order=newest_first выдача отсортирована по времени; по умолчанию Vinted сортирует по релевантности
+    return parse_qs(urlparse(api_url).query).get("order") == ["newest_first"]
+
+
+def query_hash(api_url: str) -> int:
+    # Стабильный 64-битный ключ канонического API URL (влезает в INTEGER SQLite)
+    return int.from_bytes(hashlib.sha1(api_url.encode()).digest()[:8], "big", signed=True)